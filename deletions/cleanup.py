@@ -0,0 +1,243 @@
+"""
+Batched removal of the rows and media of a soft-deleted user, post or vlog.
+
+Each kind of `DeletionJob` is a list of steps, each a queryset of rows to delete. `run()`
+deletes every step's rows BATCH_SIZE primary keys at a time, dependents first, so that the
+final delete of the entity itself cascades over nothing and no statement locks more than
+one batch of rows. The S3 keys of a batch are stored on the job in the same transaction as
+the delete and purged with `delete_objects` right after, so keys are never lost between
+the two even if the worker dies. Keys still referenced by another row (shared avatars,
+vlog derivatives reused through `MediaDigest`) are left in place.
+"""
+import os
+import time
+import logging
+from collections import defaultdict, namedtuple
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from posts.models import Post, Comment as PostComment, Like as PostLike, HiddenPost
+from profiles.models import Follow, Profile
+from trend.s3_utils import S3
+from uploads.gc import DELETE_BATCH_SIZE, storage_key
+from users.models import BlockedUser, CustomUser
+from vlogs.models import MediaDigest, Vlog, Comment as VlogComment, Like as VlogLike
+from .models import DeletionJob
+
+logger = logging.getLogger('deletions')
+
+
+BATCH_SIZE = 500
+
+# `keys(rows, pks)` returns the S3 keys to purge once `rows` are deleted,
+# `before_delete(rows)` runs in the transaction of the delete
+Step = namedtuple('Step', ['name', 'queryset', 'keys', 'before_delete'], defaults=[None, None])
+
+# (model, field, whether the field is relative to the media storage location)
+KEY_REFERENCES = [
+    (Post, 'image_key', False),
+    (Post, 'image', True),
+    (Profile, 'avatar_key', False),
+    (Profile, 'background_pic_key', False),
+    (CustomUser, 'avatar_key', False),
+    (Vlog, 'vlog_key', False),
+    (Vlog, 'thumbnail', True),
+    (Vlog, 'playlist_key', False),
+    (MediaDigest, 'thumbnail', True),
+    (MediaDigest, 'playlist_key', False),
+]
+
+
+def referenced_elsewhere(keys, model, pks):
+    """The `keys` still referenced by a row other than the `model` rows `pks`."""
+    referenced = set()
+    for ref_model, field, relative in KEY_REFERENCES:
+        if relative:
+            names = {key[len('media/'):]: key for key in keys if key.startswith('media/')}
+        else:
+            names = {key: key for key in keys}
+        if not names:
+            continue
+        queryset = ref_model._base_manager.filter(**{f'{field}__in': names})
+        if ref_model is model:
+            queryset = queryset.exclude(pk__in=pks)
+        referenced.update(names[name] for name in queryset.values_list(field, flat=True))
+    return referenced
+
+
+def unreferenced(keys, model, pks):
+    keys = {key for key in keys if key}
+    return keys - referenced_elsewhere(keys, model, pks)
+
+
+def post_keys(posts, pks):
+    keys = set()
+    for image_key, image in posts.values_list('image_key', 'image'):
+        keys.update((str(image_key), storage_key(image)))
+    return unreferenced(keys, Post, pks)
+
+
+def vlog_keys(vlogs, pks):
+    """
+    The upload of each vlog and its derivatives, unless the derivatives are shared with a
+    `MediaDigest` entry or another vlog, in which case the whole set of them is kept.
+    """
+    rows = list(vlogs.values_list('vlog_key', 'thumbnail', 'thumbnails', 'playlist_key'))
+    candidates = set()
+    for vlog_key, thumbnail, _, playlist_key in rows:
+        candidates.update((vlog_key, storage_key(thumbnail), playlist_key))
+    candidates.discard(None)
+    candidates.discard('')
+    referenced = referenced_elsewhere(candidates, Vlog, pks)
+
+    keys = set()
+    for vlog_key, thumbnail, thumbnails, playlist_key in rows:
+        if vlog_key and vlog_key not in referenced:
+            keys.add(vlog_key)
+        derivatives = {storage_key(thumbnail), playlist_key} - {None, ''}
+        if derivatives & referenced:
+            continue
+        keys.update(derivatives)
+        keys.update(key for formats in (thumbnails or {}).values() for key in formats.values())
+        if playlist_key:
+            # Renditions and segments sit next to the master playlist
+            keys.add(os.path.dirname(playlist_key) + '/')
+    return keys
+
+
+def profile_keys(profiles, pks):
+    keys = set()
+    for avatar_key, background_pic_key in profiles.values_list('avatar_key', 'background_pic_key'):
+        keys.update((avatar_key, background_pic_key))
+    return unreferenced(keys, Profile, pks)
+
+
+def user_keys(users, pks):
+    return unreferenced(users.values_list('avatar_key', flat=True), CustomUser, pks)
+
+
+def decrement(model, field, fk):
+    """`before_delete` moving `field` of the `model` rows the deleted rows point to by `fk`."""
+    def before_delete(rows):
+        ids_by_count = defaultdict(list)
+        for row in rows.order_by().values(fk).annotate(count=Count('pk')):
+            ids_by_count[row['count']].append(row[fk])
+        for count, ids in ids_by_count.items():
+            model._base_manager.filter(pk__in=ids).update(**{field: Greatest(F(field) - count, 0)})
+    return before_delete
+
+
+def post_steps(post_id):
+    return [
+        Step('post_comments', PostComment.objects.filter(post_id=post_id)),
+        Step('post_likes', PostLike.objects.filter(post_id=post_id)),
+        Step('hidden_posts', HiddenPost.objects.filter(post_id=post_id)),
+        Step('posts', Post.all_objects.filter(pk=post_id), post_keys),
+    ]
+
+
+def vlog_steps(vlog_id):
+    return [
+        Step('vlog_comments', VlogComment.objects.filter(vlog_id=vlog_id)),
+        Step('vlog_likes', VlogLike.objects.filter(vlog_id=vlog_id)),
+        Step('vlogs', Vlog.all_objects.filter(pk=vlog_id), vlog_keys),
+    ]
+
+
+def user_steps(user_id):
+    return [
+        # The user's activity on other accounts' content first, it is still visible
+        Step('own_post_likes', PostLike.objects.filter(user_id=user_id), before_delete=decrement(Post, 'likes_count', 'post_id')),
+        Step('own_post_comments', PostComment.objects.filter(user_id=user_id), before_delete=decrement(Post, 'comments_count', 'post_id')),
+        Step('own_vlog_likes', VlogLike.objects.filter(user_id=user_id), before_delete=decrement(Vlog, 'likes_count', 'vlog_id')),
+        Step('own_vlog_comments', VlogComment.objects.filter(user_id=user_id), before_delete=decrement(Vlog, 'comments_count', 'vlog_id')),
+        Step('follows', Follow.objects.filter(Q(follower_id=user_id) | Q(following_id=user_id))),
+        Step('blocks', BlockedUser.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id))),
+        Step('own_hidden_posts', HiddenPost.objects.filter(user_id=user_id)),
+        Step('post_comments', PostComment.objects.filter(post__user_id=user_id)),
+        Step('post_likes', PostLike.objects.filter(post__user_id=user_id)),
+        Step('hidden_posts', HiddenPost.objects.filter(post__user_id=user_id)),
+        Step('posts', Post.all_objects.filter(user_id=user_id), post_keys),
+        Step('vlog_comments', VlogComment.objects.filter(vlog__user_id=user_id)),
+        Step('vlog_likes', VlogLike.objects.filter(vlog__user_id=user_id)),
+        Step('vlogs', Vlog.all_objects.filter(user_id=user_id), vlog_keys),
+        Step('profiles', Profile.all_objects.filter(user_id=user_id), profile_keys),
+        Step('users', CustomUser.all_objects.filter(pk=user_id), user_keys),
+    ]
+
+
+STEPS = {
+    DeletionJob.USER: user_steps,
+    DeletionJob.POST: post_steps,
+    DeletionJob.VLOG: vlog_steps,
+}
+
+
+def steps(job):
+    return STEPS[job.kind](job.object_id)
+
+
+def purge(job, s3):
+    """Delete the job's pending keys and the objects under its pending prefixes from S3."""
+    keys = {key for key in job.pending_keys if not key.endswith('/')}
+    for prefix in job.pending_keys:
+        if prefix.endswith('/'):
+            keys.update(obj['Key'] for obj in s3.list_files(prefix))
+    keys = sorted(keys)
+    errors = 0
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        failed = s3.delete_files(keys[start:start + DELETE_BATCH_SIZE])
+        for error in failed:
+            logger.warning(f"Could not delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        errors += len(failed)
+    # Objects that failed are left to the media garbage collection
+    job.purged_keys += len(keys) - errors
+    job.purge_errors += errors
+    job.pending_keys = []
+    job.save(update_fields=['pending_keys', 'purged_keys', 'purge_errors', 'updated_at'])
+
+
+def delete_batch(job, step, s3):
+    """Delete the next batch of the step's rows, return how many there were."""
+    pks = list(step.queryset.order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+    if not pks:
+        return 0
+    rows = step.queryset.model._base_manager.filter(pk__in=pks)
+    keys = step.keys(rows, pks) if step.keys else ()
+    with transaction.atomic():
+        if step.before_delete:
+            step.before_delete(rows)
+        rows.delete()
+        job.progress[step.name] = job.progress.get(step.name, 0) + len(pks)
+        job.pending_keys = sorted(set(job.pending_keys) | set(keys))
+        job.save(update_fields=['progress', 'pending_keys', 'updated_at'])
+    if job.pending_keys:
+        purge(job, s3)
+    return len(pks)
+
+
+def run(job, deadline):
+    """
+    Resume the job where it stopped and run it until it is done or `deadline` (a
+    `time.monotonic()` value) is reached. Return whether the job is completed.
+    """
+    s3 = S3()
+    if job.pending_keys:
+        purge(job, s3)
+    job_steps = steps(job)
+    names = [step.name for step in job_steps]
+    start = names.index(job.step) if job.step in names else 0
+    for step in job_steps[start:]:
+        if job.step != step.name:
+            job.step = step.name
+            job.save(update_fields=['step', 'updated_at'])
+        while delete_batch(job, step, s3):
+            if time.monotonic() >= deadline:
+                return False
+    job.status = DeletionJob.COMPLETED
+    job.step = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'step', 'finished_at', 'updated_at'])
+    logger.info(f"Deleted {job.kind} {job.object_id}: {job.progress}, {job.purged_keys} S3 objects purged")
+    return True
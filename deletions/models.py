@@ -0,0 +1,58 @@
+from django.db import models
+
+
+class DeletionJob(models.Model):
+    """
+    Removal of a soft-deleted user, post or vlog by `deletions.tasks.run_deletion_job`.
+
+    The job walks the cleanup steps of its kind (`deletions.cleanup.steps`) one bounded
+    batch at a time and saves its position after every batch, so a run that dies or runs
+    out of time is resumed where it stopped.
+    """
+    USER = 'user'
+    POST = 'post'
+    VLOG = 'vlog'
+
+    KIND_CHOICES = [
+        (USER, 'User'),
+        (POST, 'Post'),
+        (VLOG, 'Vlog'),
+    ]
+
+    PENDING = 'pending'
+    FAILED = 'failed'
+    COMPLETED = 'completed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+        (COMPLETED, 'Completed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Step being run, and {step: rows deleted}
+    step = models.CharField(max_length=30, blank=True, null=True)
+    progress = models.JSONField(default=dict, blank=True)
+    # S3 keys (prefixes end with '/') of the rows already deleted, purged after every batch
+    pending_keys = models.JSONField(default=list, blank=True)
+    purged_keys = models.PositiveIntegerField(default=0)
+    purge_errors = models.PositiveIntegerField(default=0)
+    # A run holds the job until `locked_until`, failed runs count in `attempts`
+    locked_until = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        indexes = [
+            # The sweeper looks for pending jobs nobody holds
+            models.Index(fields=['status', 'locked_until']),
+        ]
+
+    def __str__(self):
+        return f'Deletion of {self.kind} {self.object_id} ({self.status})'
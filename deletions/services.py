@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.utils import timezone
+from posts.models import Post
+from profiles.models import Profile
+from profiles.signals import adjust_stat
+from trend.response_cache import bump_version
+from users.models import CustomUser
+from vlogs.models import Vlog, VlogProcessingTask
+from .models import DeletionJob
+from .tasks import run_deletion_job
+
+
+def schedule(kind, object_id):
+    job, _ = DeletionJob.objects.get_or_create(kind=kind, object_id=object_id)
+    transaction.on_commit(lambda: run_deletion_job.delay(job.pk))
+    return job
+
+
+def stop_processing(vlogs):
+    """Finish the processing jobs of `vlogs` so the sweeper does not enqueue them again."""
+    VlogProcessingTask.objects.filter(vlog__in=vlogs, finished_at__isnull=True).update(
+        finished_at=timezone.now(), heartbeat_at=None, stage=None,
+    )
+
+
+def delete_post(post):
+    """Hide the post right away and schedule the removal of its rows and media."""
+    with transaction.atomic():
+        if not Post.objects.filter(pk=post.pk).update(deleted_at=timezone.now()):
+            return None
+        # The row is deleted later, `profiles.signals` skips soft-deleted posts
+        adjust_stat(post.user_id, 'posts_count', -1)
+        bump_version('posts')
+        return schedule(DeletionJob.POST, post.pk)
+
+
+def delete_vlog(vlog):
+    """Hide the vlog right away and schedule the removal of its rows and media."""
+    with transaction.atomic():
+        if not Vlog.objects.filter(pk=vlog.pk).update(deleted_at=timezone.now()):
+            return None
+        adjust_stat(vlog.user_id, 'vlogs_count', -1)
+        stop_processing(Vlog.all_objects.filter(pk=vlog.pk))
+        bump_version('vlogs')
+        return schedule(DeletionJob.VLOG, vlog.pk)
+
+
+def delete_user(user):
+    """
+    Hide the account, its profile, posts and vlogs right away and schedule the removal of
+    everything it owns. The username and phone number are released for new accounts.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        marked = CustomUser.objects.filter(pk=user.pk).update(
+            deleted_at=now, is_active=False, username=f'deleted_{user.pk}', phone_number=None,
+        )
+        if not marked:
+            return None
+        Profile.objects.filter(user_id=user.pk).update(deleted_at=now)
+        Post.objects.filter(user_id=user.pk).update(deleted_at=now)
+        Vlog.objects.filter(user_id=user.pk).update(deleted_at=now)
+        stop_processing(Vlog.all_objects.filter(user_id=user.pk))
+        bump_version('posts')
+        bump_version('vlogs')
+        return schedule(DeletionJob.USER, user.pk)
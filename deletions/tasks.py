@@ -0,0 +1,65 @@
+import time
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger('deletions')
+
+
+RUN_DURATION = 40  # seconds a run spends before handing over to a new one, under the soft time limit
+LOCK_TIMEOUT = 60 * 2  # seconds, longer than the hard time limit of a run
+MAX_ATTEMPTS = 5
+SWEEP_BATCH_SIZE = 100
+
+
+@shared_task
+def run_deletion_job(job_id):
+    """
+    Run a `DeletionJob` for at most RUN_DURATION seconds, then enqueue the next run.
+
+    The run holds the job until `locked_until`, so a duplicate delivery skips it. A run
+    that fails or dies releases it to `resume_deletion_jobs`, which resumes it from the
+    last saved batch.
+    """
+    from .cleanup import run
+    from .models import DeletionJob
+    now = timezone.now()
+    claimed = DeletionJob.objects.filter(pk=job_id, status=DeletionJob.PENDING).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).update(locked_until=now + timedelta(seconds=LOCK_TIMEOUT))
+    if not claimed:
+        logger.info(f"Deletion job {job_id} is finished or being run, skipping")
+        return
+    job = DeletionJob.objects.get(pk=job_id)
+    try:
+        done = run(job, deadline=time.monotonic() + RUN_DURATION)
+    except Exception as e:
+        job.refresh_from_db(fields=['attempts'])
+        failed = job.attempts + 1 >= MAX_ATTEMPTS
+        DeletionJob.objects.filter(pk=job_id).update(
+            attempts=F('attempts') + 1, locked_until=None, error_message=str(e),
+            status=DeletionJob.FAILED if failed else DeletionJob.PENDING,
+        )
+        logger.error(f"Error running deletion job {job_id} ({job.kind} {job.object_id}): {e}", exc_info=e)
+        return
+    DeletionJob.objects.filter(pk=job_id).update(locked_until=None)
+    if not done:
+        run_deletion_job.delay(job_id)
+
+
+@shared_task
+def resume_deletion_jobs(batch_size=SWEEP_BATCH_SIZE):
+    """Enqueue again the pending deletion jobs nobody holds, whose run failed, died or was lost."""
+    from .models import DeletionJob
+    now = timezone.now()
+    idle = DeletionJob.objects.filter(status=DeletionJob.PENDING).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).filter(updated_at__lt=now - timedelta(seconds=LOCK_TIMEOUT))
+    job_ids = list(idle.order_by('pk').values_list('pk', flat=True)[:batch_size])
+    for job_id in job_ids:
+        run_deletion_job.delay(job_id)
+    if job_ids:
+        logger.warning(f"Resumed {len(job_ids)} deletion jobs")
+    return len(job_ids)
@@ -0,0 +1,80 @@
+import time
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from posts.models import Comment, Like, Post
+from users.models import CustomUser
+from vlogs.models import MediaDigest, Vlog
+from .cleanup import referenced_elsewhere, run, vlog_keys
+from .models import DeletionJob
+
+
+class ReferencedElsewhereTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('author', 'author@example.com', 'password')
+
+    def test_key_shared_with_another_row(self):
+        post = Post.objects.create(user=self.user, content='post', image_key='media/posts/shared.jpg')
+        other = Post.objects.create(user=self.user, content='repost', image_key='media/posts/shared.jpg')
+        keys = {'media/posts/shared.jpg'}
+        self.assertEqual(referenced_elsewhere(keys, Post, [post.pk]), keys)
+        # Rows being deleted together do not keep each other's keys
+        self.assertEqual(referenced_elsewhere(keys, Post, [post.pk, other.pk]), set())
+
+    def test_soft_deleted_rows_still_reference_their_keys(self):
+        post = Post.objects.create(user=self.user, content='post', image_key='media/posts/shared.jpg')
+        Post.objects.create(user=self.user, content='repost', image_key='media/posts/shared.jpg',
+                            deleted_at=timezone.now())
+        self.assertEqual(referenced_elsewhere({'media/posts/shared.jpg'}, Post, [post.pk]), {'media/posts/shared.jpg'})
+
+    def test_storage_relative_fields(self):
+        vlog = Vlog.objects.create(user=self.user, vlog_key='media/vlogs/a.mp4', title='vlog',
+                                   thumbnail='thumbnails/1/a/detail.jpg')
+        MediaDigest.objects.create(sha256='0' * 64, thumbnail='thumbnails/1/a/detail.jpg',
+                                   playlist_key='media/hls/1/a/master.m3u8')
+        keys = {'media/thumbnails/1/a/detail.jpg', 'media/hls/1/a/master.m3u8', 'media/vlogs/a.mp4'}
+        self.assertEqual(referenced_elsewhere(keys, Vlog, [vlog.pk]),
+                         {'media/thumbnails/1/a/detail.jpg', 'media/hls/1/a/master.m3u8'})
+
+    def test_vlog_derivatives_reused_through_media_digest_are_kept(self):
+        thumbnails = {'detail': {'jpeg': 'media/thumbnails/1/a/detail.jpg'}}
+        vlog = Vlog.objects.create(user=self.user, vlog_key='media/vlogs/a.mp4', title='vlog',
+                                   thumbnail='thumbnails/1/a/detail.jpg', thumbnails=thumbnails,
+                                   playlist_key='media/hls/1/a/master.m3u8')
+        vlogs = Vlog.objects.filter(pk=vlog.pk)
+        self.assertEqual(vlog_keys(vlogs, [vlog.pk]), {
+            'media/vlogs/a.mp4', 'media/thumbnails/1/a/detail.jpg', 'media/hls/1/a/master.m3u8', 'media/hls/1/a/',
+        })
+        MediaDigest.objects.create(sha256='0' * 64, thumbnail='thumbnails/1/a/detail.jpg', thumbnails=thumbnails,
+                                   playlist_key='media/hls/1/a/master.m3u8')
+        self.assertEqual(vlog_keys(vlogs, [vlog.pk]), {'media/vlogs/a.mp4'})
+
+
+@mock.patch('deletions.cleanup.S3')
+class RunTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('author', 'author@example.com', 'password')
+        self.post = Post.objects.create(user=self.user, content='post', image_key='media/posts/a.jpg',
+                                        deleted_at=timezone.now())
+        Comment.objects.create(post=self.post, user=self.user, content='comment')
+        Like.objects.create(post=self.post, user=self.user)
+        self.job = DeletionJob.objects.create(kind=DeletionJob.POST, object_id=self.post.pk)
+
+    def test_post_rows_and_media_are_removed(self, S3):
+        S3.return_value.delete_files.return_value = []
+        self.assertTrue(run(self.job, deadline=time.monotonic() + 60))
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Comment.objects.exists() or Like.objects.exists())
+        S3.return_value.delete_files.assert_called_once_with(['media/posts/a.jpg'])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.purged_keys, self.job.pending_keys), (DeletionJob.COMPLETED, 1, []))
+        self.assertEqual(self.job.progress, {'post_comments': 1, 'post_likes': 1, 'posts': 1})
+
+    def test_run_stops_at_the_deadline_and_resumes(self, S3):
+        S3.return_value.delete_files.return_value = []
+        self.assertFalse(run(self.job, deadline=0))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.step), (DeletionJob.PENDING, 'post_comments'))
+        self.assertTrue(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(run(self.job, deadline=time.monotonic() + 60))
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
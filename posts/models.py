@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from django.conf import settings
+from trend.soft_delete import SoftDeleteManager
 from users.models import CustomUser
 
 
@@ -9,17 +10,32 @@ class Post(models.Model):
     image = models.ImageField(upload_to='posts/')
     image_key = models.CharField(max_length=255, default=uuid.uuid4)  # Store the S3 key (UUID key)
     content = models.TextField()
+    # Denormalized counters, kept in sync with F() updates and reconciled by `posts.tasks.reconcile_post_counters`
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set while `deletions.tasks` removes the post, see `trend.soft_delete`
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f'Post by {self.user.username}'
 
     def get_likes_count(self):
-        return self.post_likes.count()
+        return self.likes_count
 
     def get_comments_count(self):
-        return self.post_comments.count()
+        return self.comments_count
 
 
 class Comment(models.Model):
@@ -29,6 +45,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user.username} on post {self.post.id}'
 
@@ -43,6 +64,9 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('user', 'post') 
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id']),
+        ]
 
 
 class HiddenPost(models.Model):
@@ -1,10 +1,10 @@
 from rest_framework import serializers
 # from profiles.pagination import CustomPageNumberPagination
 from profiles.models import Profile
-from profiles.serializers import ProfileSerializer
+from profiles.serializers import ProfileSerializer, UserProfileListSerializer
+from trend import like_buffer
+from trend.media_urls import media_url, media_urls
 from .models import Post, Comment, Like, HiddenPost
-from django.conf import settings
-from urllib.parse import urljoin
 
 class PostCommentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +20,29 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'updated_at']
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Resolve which posts of the page the viewer liked with a single IN query and
+    expose them to the child serializer as `liked_post_ids` in the context.
+    The image URLs of the page are resolved in one batch as well.
+    """
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        media_urls(post.image_key for post in posts)
+        request = self.context.get('request')
+        if request and hasattr(request, 'user') and request.user.is_authenticated:
+            liked_post_ids = self.context.setdefault('liked_post_ids', set())
+            liked_post_ids.update(
+                Like.objects.filter(user=request.user, post_id__in=[post.id for post in posts])
+                .values_list('post_id', flat=True)
+            )
+            like_buffer.apply_to_instances(like_buffer.POST, posts, request.user, liked_post_ids)
+        else:
+            like_buffer.apply_to_instances(like_buffer.POST, posts)
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     profile_id = serializers.ReadOnlyField(source='user.profile.id')
@@ -34,6 +57,7 @@ class PostSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'profile_id', 'username', 'content', 'created_at', 'updated_at', 'comments_count','image_key', 'likes_count','liked', 'image_url']
 
         read_only_fields = ['user', 'created_at', 'updated_at']
+        list_serializer_class = PostListSerializer
 
     def get_comments_count(self, obj):
         return obj.get_comments_count()
@@ -45,14 +69,18 @@ class PostSerializer(serializers.ModelSerializer):
         """Does post liked by auth user or not"""
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
-            return obj.post_likes.filter(user=request.user).exists()
+            liked_post_ids = self.context.get('liked_post_ids')
+            if liked_post_ids is not None:
+                return obj.id in liked_post_ids
+            liked = obj.post_likes.filter(user=request.user).exists()
+            if like_buffer.is_enabled():
+                liked = like_buffer.pending_states(like_buffer.POST, request.user.pk, [obj.id]).get(obj.id, liked)
+            return liked
         return False
     
     def get_image_url(self, obj):
         """Generate the full URL for the image"""
-        if obj.image_key:
-            return urljoin(settings.MEDIA_URL, obj.image_key)
-        return None
+        return media_url(obj.image_key)
 
 
 class LikerSerializer(serializers.ModelSerializer):
@@ -61,6 +89,7 @@ class LikerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ('profile',)
+        list_serializer_class = UserProfileListSerializer
 
 
 class HiddenPostSerializer(serializers.ModelSerializer):
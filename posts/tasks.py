@@ -0,0 +1,64 @@
+import logging
+from celery import shared_task
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from trend import like_buffer, trending
+from .models import Post, Like, Comment
+
+logger = logging.getLogger('posts')
+
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+def real_counters():
+    """Counter expressions computed from the like and comment tables."""
+    likes = Like.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('*')).values('c')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('*')).values('c')
+    return {
+        'likes_count': Coalesce(Subquery(likes), 0),
+        'comments_count': Coalesce(Subquery(comments), 0),
+    }
+
+
+@shared_task
+def reconcile_post_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Walk the posts table in primary key batches and rewrite the like/comment
+    counters of every post that drifted from the real tables.
+    """
+    last_id = 0
+    fixed = 0
+    while True:
+        batch = list(Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        counters = real_counters()
+        stale_ids = list(
+            Post.objects.filter(pk__in=batch)
+            .annotate(real_likes=counters['likes_count'], real_comments=counters['comments_count'])
+            .filter(~Q(likes_count=F('real_likes')) | ~Q(comments_count=F('real_comments')))
+            .values_list('pk', flat=True)
+        )
+        if stale_ids:
+            # Recount inside the UPDATE itself so writes made since the check are not lost
+            fixed += Post.objects.filter(pk__in=stale_ids).update(**real_counters())
+    logger.info(f"Reconciled counters for {fixed} posts")
+    return fixed
+
+
+@shared_task
+def flush_post_likes():
+    """Apply the likes buffered in Redis (`LIKE_WRITE_BEHIND`) to the DB."""
+    flushed = like_buffer.flush(like_buffer.POST, Post, Like, 'post', 'posts')
+    if flushed:
+        logger.info(f"Flushed {flushed} buffered post likes")
+    return flushed
+
+
+@shared_task
+def recompute_trending_posts():
+    ranked = trending.recompute(trending.POST)
+    logger.info(f"Recomputed trending posts, {ranked} ranked")
+    return ranked
@@ -1,3 +1,86 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from profiles.models import Profile
+from trend import like_buffer
+from users.models import BlockedUser, CustomUser
+from .models import Comment, Like, Post
+from .tasks import flush_post_likes
 
-# Create your tests here.
+
+class PostListOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for i in range(4):
+            user = CustomUser.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            Profile.objects.create(user=user)
+            self.users.append(user)
+        self.post = Post.objects.create(user=self.users[0], content='post')
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_comments_oldest_first(self):
+        comments = [Comment.objects.create(post=self.post, user=self.users[1], content=f'comment {i}') for i in range(3)]
+        # The vlog comment list shares the URL name
+        response = self.client.get(f'/posts/{self.post.pk}/comments/', {'limit': 2})
+        self.assertEqual([c['id'] for c in response.data['results']], [comments[0].pk, comments[1].pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['id'] for c in response.data['results']], [comments[2].pk])
+
+    def test_likers_most_recent_like_first(self):
+        start = timezone.now() - timedelta(hours=1)
+        # Liked in the reverse order of the users' creation
+        for minutes, user in enumerate(reversed(self.users[1:])):
+            like = Like.objects.create(post=self.post, user=user)
+            Like.objects.filter(pk=like.pk).update(created_at=start + timedelta(minutes=minutes))
+        BlockedUser.objects.create(blocker=self.users[2], blocked=self.users[0])
+
+        url = reverse('post-likers-list', args=[self.post.pk])
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual([u['profile']['username'] for u in response.data['results']], ['user1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['profile']['username'] for u in response.data['results']], ['user3'])
+        self.assertIsNone(response.data['next'])
+
+
+@override_settings(LIKE_WRITE_BEHIND=True)
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [CustomUser.objects.create_user(f'user{i}', f'user{i}@example.com', 'password') for i in range(4)]
+        self.post = Post.objects.create(user=self.users[0], content='post')
+        # user3 liked the post before the buffer was turned on
+        Like.objects.create(post=self.post, user=self.users[3])
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+
+    def tap(self, user):
+        post = Post.objects.get(pk=self.post.pk)
+        return like_buffer.toggle(like_buffer.POST, post, user.pk,
+                                  lambda: Like.objects.filter(post=post, user=user).exists())
+
+    def test_flush_applies_the_last_state_of_each_user(self):
+        self.assertTrue(self.tap(self.users[1]))
+        self.assertTrue(self.tap(self.users[2]))
+        self.assertFalse(self.tap(self.users[2]))
+        self.assertFalse(self.tap(self.users[3]))
+        # Readers see the buffered count before the flush
+        self.assertEqual(like_buffer.buffered_counts(like_buffer.POST, [self.post.pk]), {self.post.pk: 1})
+
+        self.assertEqual(flush_post_likes(), 4)
+        self.assertEqual(set(Like.objects.filter(post=self.post).values_list('user_id', flat=True)), {self.users[1].pk})
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes_count, 1)
+        # The applied state is dropped from the buffer, a second flush has nothing to do
+        self.assertEqual(like_buffer.buffered_counts(like_buffer.POST, [self.post.pk]), {})
+        self.assertEqual(like_buffer.pending_states(like_buffer.POST, self.users[2].pk, [self.post.pk]), {})
+        self.assertEqual(flush_post_likes(), 0)
+
+    def test_flush_drops_taps_on_deleted_posts(self):
+        self.tap(self.users[1])
+        Post.all_objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(flush_post_likes(), 1)
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(like_buffer.buffered_counts(like_buffer.POST, [self.post.pk]), {})
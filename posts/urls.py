@@ -2,12 +2,14 @@ from django.urls import path
 from .views import (
     PostListView, PostDetailView, PostCreateView, PostUpdateView, PostDeleteView,
     CommentListView, CommentCreateView, CommentDetailView, CommentUpdateView, CommentDeleteView, ToggleLikeView, UserPostsListView, PostLikersList,HideorUnhidePostView,
+    TrendingPostListView,
 )
 urlpatterns = [
     # Post URLs
     path('posts/', PostListView.as_view(), name='post-list'),
     # path('posts/generate-presigned-url/', GeneratePresignedUrlView.as_view(), name='generate-presigned-url'),
     path('posts/create/', PostCreateView.as_view(), name='post-create'),
+    path('posts/trending/', TrendingPostListView.as_view(), name='post-trending'),
     path('posts/<int:pk>/', PostDetailView.as_view(), name='post-detail'),
     path('posts/<int:pk>/update/', PostUpdateView.as_view(), name='post-update'),
     path('posts/<int:pk>/delete/', PostDeleteView.as_view(), name='post-delete'),
@@ -1,34 +1,64 @@
 import uuid
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from rest_framework.response import Response
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from profiles.pagination import CustomPageNumberPagination
-from users.models import CustomUser, BlockedUser
+from deletions.services import delete_post
+from profiles.pagination import KeysetPagination, OldestFirstKeysetPagination
+from trend import like_buffer, trending
+from trend.response_cache import VersionedListCacheMixin
+from trend.views import TrendingListView
+from users.blocks import get_block_set
 from .models import Post, Comment, Like, HiddenPost
 from .serializers import PostSerializer, PostCommentSerializer, LikerSerializer, HiddenPostSerializer
 
 
-class PostListView(generics.ListAPIView):
+class PostListView(VersionedListCacheMixin, generics.ListAPIView):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
+    cache_namespace = 'posts'
 
     def get_queryset(self):
+        """
+        Shared by every viewer so the serialized page can be cached once, see `apply_viewer_overlay`.
+        """
+        return super().get_queryset().select_related('user', 'user__profile')
+
+    def apply_viewer_overlay(self, request, body):
         '''
         Restrict the user from viewing posts if blocked. This means the posts will not be available for liking or commenting, effectively preventing a blocked user from liking or commenting
         '''
-        queryset = super().get_queryset().select_related('user').prefetch_related('post_likes', 'post_comments')
-        user = self.request.user
-        if user.is_authenticated:
-            blocked_users = BlockedUser.objects.filter(blocker=user).values_list('blocked', flat=True)
-            blocked_by_users = BlockedUser.objects.filter(blocked=user).values_list('blocker', flat=True)
-            users_to_exclude = list(set(blocked_users).union(set(blocked_by_users)))
-            # Retrieve IDs of posts hidden by any user
-            hidden_post_ids = HiddenPost.objects.filter(user=user).values_list('post_id', flat=True)
-            queryset = Post.objects.exclude(user__in=users_to_exclude).exclude(id__in=hidden_post_ids)
+        users_to_exclude = get_block_set(request.user)
+        results = [dict(post) for post in body['results'] if post['user'] not in users_to_exclude]
+        post_ids = [post['id'] for post in results]
+        hidden_post_ids = set(HiddenPost.objects.filter(user=request.user, post_id__in=post_ids).values_list('post_id', flat=True))
+        liked_post_ids = set(Like.objects.filter(user=request.user, post_id__in=post_ids).values_list('post_id', flat=True))
+        results = [post for post in results if post['id'] not in hidden_post_ids]
+        if like_buffer.is_enabled():
+            like_buffer.apply_pending(like_buffer.POST, request.user, post_ids, liked_post_ids)
+            counts = like_buffer.buffered_counts(like_buffer.POST, post_ids)
+            for post in results:
+                post['likes_count'] = counts.get(post['id'], post['likes_count'])
+        for post in results:
+            post['liked'] = post['id'] in liked_post_ids
+        return {**body, 'results': results}
+
+
+class TrendingPostListView(TrendingListView):
+    """
+    Posts ranked by recent likes, comments and views, see `trend.trending`.
+    """
+    queryset = Post.objects.select_related('user', 'user__profile')
+    trending_kind = trending.POST
+    serializer_class = PostSerializer
 
-        return queryset.order_by('-created_at')
+    def get_queryset(self):
+        return super().get_queryset().exclude(hidden_by__user=self.request.user)
 
 
 class PostDetailView(generics.RetrieveAPIView):
@@ -36,6 +66,11 @@ class PostDetailView(generics.RetrieveAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_object(self):
+        post = super().get_object()
+        like_buffer.apply_to_instances(like_buffer.POST, [post])
+        trending.record(trending.POST, post.pk, trending.VIEW)
+        return post
 
 
 
@@ -46,7 +81,8 @@ class PostCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         #  file_key is obtained from the client after upload
         file_key = self.request.data.get('file_key')
-        serializer.save(user=self.request.user, image_key=file_key)
+        with transaction.atomic():
+            serializer.save(user=self.request.user, image_key=file_key)
         # serializer.save(user=self.request.user)
 
 
@@ -61,9 +97,14 @@ class PostDeleteView(generics.DestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        # Hidden right away, the comments, likes and image are removed by `deletions.tasks`
+        delete_post(instance)
+
 
 class CommentListView(generics.ListAPIView):
     serializer_class = PostCommentSerializer
+    pagination_class = OldestFirstKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -87,7 +128,10 @@ class CommentCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         post_id = self.kwargs.get('post_id')
-        serializer.save(post_id=post_id, user=self.request.user)
+        with transaction.atomic():
+            serializer.save(post_id=post_id, user=self.request.user)
+            Post.objects.filter(pk=post_id).update(comments_count=F('comments_count') + 1)
+        trending.record(trending.POST, post_id, trending.COMMENT)
 
 
 class CommentUpdateView(generics.UpdateAPIView):
@@ -101,6 +145,11 @@ class CommentDeleteView(generics.DestroyAPIView):
     serializer_class = PostCommentSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Post.objects.filter(pk=instance.post_id).update(comments_count=Greatest(F('comments_count') - 1, 0))
+
 
 class ToggleLikeView(APIView):
     permission_classes = [IsAuthenticated]
@@ -113,13 +162,24 @@ class ToggleLikeView(APIView):
         except Post.DoesNotExist:
             return Response({'error': 'Post not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            like = Like.objects.get(post=post, user=request.user)
-            like.delete()
-            return Response({'status': 'Disliked'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            Like.objects.create(post=post, user=request.user)
-            return Response({'status': 'Liked'}, status=status.HTTP_200_OK)
+        if like_buffer.is_enabled():
+            liked = like_buffer.toggle(like_buffer.POST, post, request.user.pk,
+                                       lambda: Like.objects.filter(post=post, user=request.user).exists())
+            if liked:
+                trending.record(trending.POST, post.pk, trending.LIKE)
+            return Response({'status': 'Liked' if liked else 'Disliked'}, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            try:
+                like = Like.objects.get(post=post, user=request.user)
+                like.delete()
+                Post.objects.filter(pk=post.pk).update(likes_count=Greatest(F('likes_count') - 1, 0))
+                return Response({'status': 'Disliked'}, status=status.HTTP_200_OK)
+            except Like.DoesNotExist:
+                Like.objects.create(post=post, user=request.user)
+                Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 1)
+                trending.record(trending.POST, post.pk, trending.LIKE)
+                return Response({'status': 'Liked'}, status=status.HTTP_200_OK)
 
 
 class UserPostsListView(generics.ListAPIView):
@@ -127,12 +187,12 @@ class UserPostsListView(generics.ListAPIView):
     List all posts created by a specific user.
     """
     serializer_class = PostSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Post.objects.filter(user__id=user_id).order_by('-created_at')
+        return Post.objects.filter(user__id=user_id).select_related('user', 'user__profile').order_by('-created_at')
 
 
 class PostLikersList(generics.ListAPIView):
@@ -140,20 +200,23 @@ class PostLikersList(generics.ListAPIView):
         List all post Likers.
     """
     serializer_class = LikerSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        """The likes, paginated on `(Like.created_at, id)` so the most recent likers come first."""
         post_id = self.kwargs.get('post_id')
         request_user = self.request.user
         if not post_id:
-            return CustomUser.objects.none()
-        # Get list of blocked user IDs
-        blocked_users = BlockedUser.objects.filter(blocker=request_user).values_list('blocked', flat=True)
-        blocked_by_users = BlockedUser.objects.filter(blocked=request_user).values_list('blocker', flat=True)
-        users_to_exclude = list(set(blocked_users).union(set(blocked_by_users)))
-        likers_ids = Like.objects.filter(post_id=post_id).values_list('user_id', flat=True).order_by('-created_at')
-        return CustomUser.objects.filter(id__in=likers_ids).exclude(id__in=users_to_exclude).select_related('profile')
+            return Like.objects.none()
+        users_to_exclude = get_block_set(request_user)
+        return Like.objects.filter(post_id=post_id, user__deleted_at__isnull=True).exclude(
+            user_id__in=users_to_exclude
+        ).select_related('user__profile')
+
+    def paginate_queryset(self, queryset):
+        likes = super().paginate_queryset(queryset)
+        return None if likes is None else [like.user for like in likes]
 
 
 class HideorUnhidePostView(generics.GenericAPIView):
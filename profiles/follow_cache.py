@@ -0,0 +1,74 @@
+from django_redis import get_redis_connection
+from .models import Follow
+
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+# 1 day from when the list is loaded. Reads do not extend it, so a follow applied while a
+# concurrent `_load` replaced the list shows up at the latest when the list is loaded again.
+FOLLOW_LIST_TIMEOUT = 60 * 60 * 24
+# Keeps an empty list cached, always sorts below real entries
+SENTINEL = 0
+
+# Apply a follow/unfollow only to lists that are already cached, the others are loaded on their next read
+_ZADD_IF_EXISTS_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[i + 1])
+    end
+end
+return 1
+"""
+
+
+def follow_list_key(kind, user_id):
+    return f'{kind}_{user_id}'
+
+
+def _load(kind, user_id):
+    if kind == FOLLOWERS:
+        rows = Follow.objects.filter(following_id=user_id, follower__isnull=False).values_list('follower_id', 'created_at')
+    else:
+        rows = Follow.objects.filter(follower_id=user_id, following__isnull=False).values_list('following_id', 'created_at')
+    mapping = {member_id: created_at.timestamp() for member_id, created_at in rows}
+    mapping[SENTINEL] = 0
+    key = follow_list_key(kind, user_id)
+    pipe = get_redis_connection('default').pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, mapping)
+    pipe.expire(key, FOLLOW_LIST_TIMEOUT)
+    pipe.execute()
+
+
+def read(kind, user_id, score=None, reverse=False, count=10):
+    """
+    Return up to `count` (user_id, score) pairs of a follower/following list in scan order:
+    most recent follow first, starting right after `score` when given. With `reverse`
+    the scan goes from `score` towards newer follows, oldest first.
+    """
+    key = follow_list_key(kind, user_id)
+    pipe = get_redis_connection('default').pipeline()
+    pipe.exists(key)
+    if reverse:
+        pipe.zrangebyscore(key, f'({score}', '+inf', start=0, num=count, withscores=True)
+    else:
+        max_score = f'({score}' if score is not None else '+inf'
+        pipe.zrevrangebyscore(key, max_score, '(0', start=0, num=count, withscores=True)
+    cached, entries = pipe.execute()
+    if not cached:
+        _load(kind, user_id)
+        return read(kind, user_id, score=score, reverse=reverse, count=count)
+    return [(int(member), member_score) for member, member_score in entries]
+
+
+def add_follow(follow):
+    script = get_redis_connection('default').register_script(_ZADD_IF_EXISTS_SCRIPT)
+    script(keys=[follow_list_key(FOLLOWERS, follow.following_id), follow_list_key(FOLLOWING, follow.follower_id)],
+           args=[follow.created_at.timestamp(), follow.follower_id, follow.following_id])
+
+
+def remove_follow(follow):
+    pipe = get_redis_connection('default').pipeline()
+    pipe.zrem(follow_list_key(FOLLOWERS, follow.following_id), follow.follower_id)
+    pipe.zrem(follow_list_key(FOLLOWING, follow.follower_id), follow.following_id)
+    pipe.execute()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from profiles.models import Profile
+from profiles.stats import real_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the follower, following, post and vlog counters of every profile in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(Profile.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            updated += Profile.objects.filter(pk__in=batch).update(**real_stats())
+        self.stdout.write(self.style.SUCCESS(f'Recomputed stats for {updated} profiles'))
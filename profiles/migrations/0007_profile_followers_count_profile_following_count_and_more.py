@@ -0,0 +1,55 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_stats(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    Follow = apps.get_model('profiles', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Vlog = apps.get_model('vlogs', 'Vlog')
+
+    def count(queryset, field):
+        return Coalesce(Subquery(queryset.filter(**{field: OuterRef('user_id')}).order_by().values(field).annotate(c=Count('*')).values('c')), 0)
+
+    Profile.objects.update(
+        followers_count=count(Follow.objects.filter(follower__isnull=False), 'following'),
+        following_count=count(Follow.objects.filter(following__isnull=False), 'follower'),
+        posts_count=count(Post.objects.all(), 'user'),
+        vlogs_count=count(Vlog.objects.all(), 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_remove_profile_avatar'),
+        ('posts', '0005_comment_posts_comme_post_id_9df848_idx_and_more'),
+        ('vlogs', '0012_comment_vlogs_comme_vlog_id_eca30e_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='vlogs_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
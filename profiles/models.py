@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from trend.soft_delete import SoftDeleteManager
 from users.models import CustomUser
 
 
@@ -10,8 +11,18 @@ class Profile( models.Model):
     avatar_key = models.CharField(max_length=255)
     # background_pic = models.ImageField(upload_to='backgrounds/', null=True, blank=True)
     background_pic_key = models.CharField(max_length=255)
+    # Denormalized stats, maintained by `profiles.signals` and recomputed by `manage.py recompute_profile_stats`
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    vlogs_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set with the user's `deleted_at`, see `trend.soft_delete`
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.user.username
@@ -1,4 +1,7 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -11,4 +14,137 @@ class CustomPageNumberPagination(PageNumberPagination):
             page_size = request.query_params.get(self.page_size_query_param, self.page_size)
             page_size = min(int(page_size), self.max_page_size)  # Ensure page size does not exceed max limit
             self.page_size = page_size
-        return super().paginate_queryset(queryset, request, view)
\ No newline at end of file
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on `(created_at, id)`, newest first unless `ordering`
+    is ascending.
+
+    Each page is a seek on the composite key instead of OFFSET/LIMIT and no
+    COUNT(*) is issued, so deep pages cost the same as the first one.
+    Supports the same `limit` query param as `CustomPageNumberPagination`.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        descending = self.ordering[0].startswith('-')
+        if self.cursor is None:
+            reverse = False
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            reverse = self.cursor.reverse
+            created_at, pk = self._parse_position(self.cursor.position)
+            # A previous page scans backwards from the position
+            lookup = 'lt' if descending != reverse else 'gt'
+            ordering = ('-created_at', '-id') if descending != reverse else ('created_at', 'id')
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at}) | Q(created_at=created_at, **{f'id__{lookup}': pk})
+            ).order_by(*ordering)
+
+        # Fetch one extra row to find out whether there is a following page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position(self.page[-1])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position(self, instance):
+        return f'{instance.created_at.isoformat()}|{instance.id}'
+
+    def _parse_position(self, position):
+        try:
+            created_at, pk = position.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    """`KeysetPagination` oldest first, for threads read in order such as comments."""
+    ordering = ('created_at', 'id')
+
+
+class SortedSetPagination(CursorPagination):
+    """
+    Cursor pagination over a Redis sorted set, highest score first.
+
+    `paginate_sorted_set` takes a `read_page(score, reverse, count)` callable returning
+    (member, score) pairs in scan order and returns the members of the requested page.
+    The cursors keep the encoding and response shape of `KeysetPagination`.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = '-score'
+
+    def paginate_sorted_set(self, read_page, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor.reverse)
+        score = self._parse_score(self.cursor.position) if self.cursor else None
+        entries = read_page(score, reverse, self.page_size + 1)
+        has_more = len(entries) > self.page_size
+        self.page = entries[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return [member for member, _ in self.page]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = repr(self.page[-1][1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = repr(self.page[0][1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _parse_score(self, position):
+        try:
+            return float(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,21 +1,47 @@
 # profiles/serializers.py
 
-from django.conf import settings
 from rest_framework import serializers
-from urllib.parse import urljoin
-from posts.models import Post
+from trend.media_urls import media_url, media_urls
 from .models import Profile, Follow
 from users.tasks import update_profile_avatar
 
 
+class ProfileListSerializer(serializers.ListSerializer):
+    """
+    Resolve which users of the page the viewer follows with a single IN query and
+    expose them to `ProfileSerializer` as `following_user_ids` in the context.
+    `user_id_attr` names the attribute holding the user id on the serialized items.
+    The avatar and background URLs of the page are resolved in one batch as well.
+    """
+    user_id_attr = 'user_id'
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        profiles = [item if isinstance(item, Profile) else getattr(item, 'profile', None) for item in items]
+        media_urls(key for profile in profiles if profile for key in (profile.avatar_key, profile.background_pic_key))
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            following_user_ids = self.context.setdefault('following_user_ids', set())
+            following_user_ids.update(
+                Follow.objects.filter(follower=request.user, following_id__in=[getattr(item, self.user_id_attr) for item in items])
+                .values_list('following_id', flat=True)
+            )
+        return super().to_representation(items)
+
+
+class UserProfileListSerializer(ProfileListSerializer):
+    """For serializers of users that nest a `ProfileSerializer` for `user.profile`."""
+    user_id_attr = 'id'
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     # avatar = serializers.ImageField(max_length=None, use_url=True, allow_null=True, required=False)
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    posts_count = serializers.ReadOnlyField()
+    followers_count = serializers.ReadOnlyField()
+    following_count = serializers.ReadOnlyField()
     is_following = serializers.SerializerMethodField()
-    vlogs_count = serializers.SerializerMethodField()
+    vlogs_count = serializers.ReadOnlyField()
     avatar_url = serializers.SerializerMethodField()
     background_pic_url = serializers.SerializerMethodField()
 
@@ -25,42 +51,24 @@ class ProfileSerializer(serializers.ModelSerializer):
             'id', 'username', 'bio', 'avatar_url', 'background_pic_url', 'is_following', 'followers_count', 'following_count', 'posts_count', 'vlogs_count',
             'created_at', 'updated_at'
         ]
-
-    def get_posts_count(self, profile):
-        return Post.objects.filter(user=profile.user).count()
-
-    def get_followers_count(self, profile):
-        if profile.user:
-            return profile.user.followers.count()
-        return 0
-
-    def get_following_count(self, profile):
-        if profile.user:
-            return profile.user.following.count()
-        return 0
-
-    def get_vlogs_count(self, profile):
-        if profile.user:
-            return profile.user.vlogs.count()
-        return 0
+        list_serializer_class = ProfileListSerializer
 
     def get_is_following(self, profile):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            following_user_ids = self.context.get('following_user_ids')
+            if following_user_ids is not None:
+                return profile.user_id in following_user_ids
             return Follow.objects.filter(follower=request.user, following=profile.user).exists()
         return False
 
     def get_avatar_url(self, obj):
         """Generate the full URL for the image"""
-        if obj.avatar_key:
-            return urljoin(settings.MEDIA_URL, obj.avatar_key)
-        return None
+        return media_url(obj.avatar_key)
 
     def get_background_pic_url(self, obj):
         """Generate the full URL for the background_pic"""
-        if obj.background_pic_key:
-            return urljoin(settings.MEDIA_URL, obj.background_pic_key)
-        return None
+        return media_url(obj.background_pic_key)
 
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
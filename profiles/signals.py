@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from posts.models import Post
+from vlogs.models import Vlog
+from . import follow_cache
+from .models import Follow, Profile
+
+
+def adjust_stat(user_id, field, delta):
+    """Atomically move one of a profile's stat counters, runs inside the caller's transaction."""
+    if user_id is None:
+        return
+    if delta > 0:
+        value = F(field) + delta
+    else:
+        value = Greatest(F(field) + delta, 0)
+    Profile.objects.filter(user_id=user_id).update(**{field: value})
+
+
+@receiver(post_save, sender=Follow)
+def add_to_follow_lists(sender, instance, created, **kwargs):
+    if created and instance.follower_id and instance.following_id:
+        adjust_stat(instance.following_id, 'followers_count', 1)
+        adjust_stat(instance.follower_id, 'following_count', 1)
+        transaction.on_commit(lambda: follow_cache.add_follow(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_follow_lists(sender, instance, **kwargs):
+    if instance.follower_id and instance.following_id:
+        adjust_stat(instance.following_id, 'followers_count', -1)
+        adjust_stat(instance.follower_id, 'following_count', -1)
+        transaction.on_commit(lambda: follow_cache.remove_follow(instance))
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_stat(instance.user_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    # Soft-deleted posts were uncounted when `deletions.services` marked them
+    if instance.deleted_at is None:
+        adjust_stat(instance.user_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Vlog)
+def count_created_vlog(sender, instance, created, **kwargs):
+    if created:
+        adjust_stat(instance.user_id, 'vlogs_count', 1)
+
+
+@receiver(post_delete, sender=Vlog)
+def count_deleted_vlog(sender, instance, **kwargs):
+    # Soft-deleted vlogs were uncounted when `deletions.services` marked them
+    if instance.deleted_at is None:
+        adjust_stat(instance.user_id, 'vlogs_count', -1)
@@ -0,0 +1,19 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from posts.models import Post
+from vlogs.models import Vlog
+from .models import Follow
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(queryset.filter(**{field: OuterRef('user_id')}).order_by().values(field).annotate(c=Count('*')).values('c')), 0)
+
+
+def real_stats():
+    """Profile stat expressions computed from the follow, post and vlog tables."""
+    return {
+        'followers_count': _count(Follow.objects.filter(follower__isnull=False), 'following'),
+        'following_count': _count(Follow.objects.filter(following__isnull=False), 'follower'),
+        'posts_count': _count(Post.objects.all(), 'user'),
+        'vlogs_count': _count(Vlog.objects.all(), 'user'),
+    }
@@ -1,3 +1,108 @@
+from datetime import timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from posts.models import Post
+from users.models import BlockedUser, CustomUser
+from .models import Follow, Profile
+from .pagination import KeysetPagination, OldestFirstKeysetPagination, SortedSetPagination
 
-# Create your tests here.
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        user = CustomUser.objects.create_user('author', 'author@example.com', 'password')
+        self.posts = [Post.objects.create(user=user, content=f'post {i}') for i in range(7)]
+        # Pairs of posts share a created_at, so pages are only stable if the id breaks ties
+        start = timezone.now() - timedelta(hours=1)
+        for i, post in enumerate(self.posts):
+            Post.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=i // 2))
+
+    def paginate(self, pagination_class, url):
+        paginator = pagination_class()
+        page = paginator.paginate_queryset(Post.objects.all(), Request(self.factory.get(url)))
+        return [post.pk for post in page], paginator.get_next_link(), paginator.get_previous_link()
+
+    def walk(self, pagination_class):
+        ids, next_url, previous_url = self.paginate(pagination_class, '/posts/?limit=3')
+        self.assertIsNone(previous_url)
+        pages = [ids]
+        while next_url:
+            ids, next_url, previous_url = self.paginate(pagination_class, next_url)
+            pages.append(ids)
+        return pages, previous_url
+
+    def test_newest_first_round_trip(self):
+        pages, previous_url = self.walk(KeysetPagination)
+        ids = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(pages, [ids[0:3], ids[3:6], ids[6:7]])
+        # The previous link of the last page leads back to the page before it
+        self.assertEqual(self.paginate(KeysetPagination, previous_url)[0], ids[3:6])
+
+    def test_oldest_first_round_trip(self):
+        pages, previous_url = self.walk(OldestFirstKeysetPagination)
+        ids = [post.pk for post in self.posts]
+        self.assertEqual(pages, [ids[0:3], ids[3:6], ids[6:7]])
+        self.assertEqual(self.paginate(OldestFirstKeysetPagination, previous_url)[0], ids[3:6])
+
+    def test_invalid_position_is_not_found(self):
+        paginator = KeysetPagination()
+        paginator.base_url = 'http://testserver/posts/'
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position='yesterday|1'))
+        with self.assertRaises(NotFound):
+            self.paginate(KeysetPagination, url)
+
+
+class SortedSetPaginationTests(TestCase):
+    # (member, score) pairs, highest score first like a ZREVRANGE
+    entries = [(member, float(100 - member)) for member in range(1, 8)]
+
+    def read_page(self, score, reverse, count):
+        if reverse:
+            return sorted((e for e in self.entries if e[1] > score), key=lambda e: e[1])[:count]
+        return [e for e in self.entries if score is None or e[1] < score][:count]
+
+    def paginate(self, url):
+        paginator = SortedSetPagination()
+        members = paginator.paginate_sorted_set(self.read_page, Request(APIRequestFactory().get(url)))
+        return members, paginator.get_next_link(), paginator.get_previous_link()
+
+    def test_round_trip(self):
+        members, next_url, previous_url = self.paginate('/followers/?limit=3')
+        self.assertEqual((members, previous_url), ([1, 2, 3], None))
+        members, next_url, previous_url = self.paginate(next_url)
+        self.assertEqual(members, [4, 5, 6])
+        members, next_url, last_previous_url = self.paginate(next_url)
+        self.assertEqual((members, next_url), ([7], None))
+        self.assertEqual(self.paginate(last_previous_url)[0], [4, 5, 6])
+        members, _, previous_url = self.paginate(previous_url)
+        self.assertEqual((members, previous_url), ([1, 2, 3], None))
+
+
+class FollowListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for i in range(5):
+            user = CustomUser.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            Profile.objects.create(user=user)
+            self.users.append(user)
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, follower in enumerate(self.users[1:]):
+            follow = Follow.objects.create(follower=follower, following=self.users[0])
+            Follow.objects.filter(pk=follow.pk).update(created_at=start + timedelta(minutes=minutes))
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[1])
+
+    def test_most_recent_follower_first_without_blocked(self):
+        # Blocking also drops the follows between the two users, so the viewer is not user0
+        BlockedUser.objects.create(blocker=self.users[1], blocked=self.users[3])
+        response = self.client.get(f'/profile/followers/{self.users[0].pk}/', {'limit': 2})
+        self.assertEqual([p['username'] for p in response.data['results']], ['user4', 'user2'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([p['username'] for p in response.data['results']], ['user1'])
+        self.assertIsNone(response.data['next'])
@@ -1,11 +1,13 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.core.cache import cache
 from .models import Profile, Follow
-from users.models import CustomUser, BlockedUser
+from users.blocks import get_block_set
+from users.models import CustomUser
 from .serializers import ProfileSerializer, ProfileUpdateSerializer, FollowSerializer
-from .pagination import CustomPageNumberPagination
+from .pagination import CustomPageNumberPagination, SortedSetPagination
+from . import follow_cache
 from rest_framework.permissions import IsAuthenticated
 
 
@@ -27,11 +29,9 @@ class ProfilesListView(generics.ListAPIView):
         # if not queryset:
         queryset = Profile.objects.all().order_by('-created_at')
         if user.is_authenticated:
-            blocked_users = BlockedUser.objects.filter(blocker=user).values_list('blocked', flat=True)
-            blocked_by_users = BlockedUser.objects.filter(blocked=user).values_list('blocker', flat=True)
-            users_to_exclude = list(set(blocked_users).union(set(blocked_by_users)))
+            users_to_exclude = get_block_set(user)
             queryset = Profile.objects.exclude(user__in=users_to_exclude)
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.select_related('user').order_by('-created_at')
             # Cache the queryset
             # cache.set(cache_key, queryset, timeout=3600)
         return queryset
@@ -73,7 +73,9 @@ class FollowUserView(generics.CreateAPIView):
         if follower == following:
             return Response({'error': 'Cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        follow, created = Follow.objects.get_or_create(follower=follower, following=following)
+        # The follow row and both profiles' counters are written together
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(follower=follower, following=following)
         if not created:
             return Response({'error': 'You are already following this user.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -102,58 +104,37 @@ class UnfollowUserView(generics.DestroyAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class FollowersListAPIView(generics.ListAPIView):
+class FollowListAPIView(generics.ListAPIView):
+    """
+    Page through a user's cached follower/following list (see `profiles.follow_cache`),
+    most recent follow first. Users blocked in either direction with the viewer are
+    skipped on read, so a page costs one Redis call and one `Profile` bulk fetch.
+    """
     serializer_class = ProfileSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = SortedSetPagination
     permission_classes = [IsAuthenticated]
+    queryset = Profile.objects.all()
+    follow_list = None
 
-    def get_queryset(self):
+    def list(self, request, *args, **kwargs):
         user_id = self.kwargs.get('pk')
-        request_user = self.request.user
-        cache_key = f'followers_{user_id}_page_{self.request.query_params.get("page", 1)}'
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-        try:
-    
-            user = CustomUser.objects.get(pk=user_id)
-            # followers = user.followers.exclude(follower__in=BlockedUser.objects.filter(blocker=request_user).values_list('blocked', flat=True))
-            followers = user.followers.all().values_list('follower', flat=True)
-            blocked_users = BlockedUser.objects.filter(blocker=request_user).values_list('blocked', flat=True)
-            followers = [follower for follower in followers if follower not in blocked_users]
-            profiles = Profile.objects.filter(user__in=followers)
-            cache.set(cache_key, profiles, timeout=60*15)  # Cache for 15 minutes
-            return profiles
-        except CustomUser.DoesNotExist:
-            return Profile.objects.none()
+        blocked_users = get_block_set(request.user)
 
+        def read_page(score, reverse, count):
+            # Over-read by the block set size so filtering does not shorten the page
+            entries = follow_cache.read(self.follow_list, user_id, score=score, reverse=reverse, count=count + len(blocked_users))
+            return [entry for entry in entries if entry[0] not in blocked_users][:count]
 
-class FollowingListAPIView(generics.ListAPIView):
-    serializer_class = ProfileSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = CustomPageNumberPagination
+        user_ids = self.paginator.paginate_sorted_set(read_page, request)
+        profiles = self.get_queryset().select_related('user').in_bulk(user_ids, field_name='user_id')
+        page = [profiles[user_id] for user_id in user_ids if user_id in profiles]
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-    def get_queryset(self):
-        user_id = self.kwargs.get('pk')
-        request_user = self.request.user
 
-        cache_key = f'following_{user_id}_page_{self.request.query_params.get("page", 1)}'
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+class FollowersListAPIView(FollowListAPIView):
+    follow_list = follow_cache.FOLLOWERS
 
-        try:
-            user = CustomUser.objects.get(pk=user_id)
-            # Get list of following user IDs
-            followings = user.following.all().values_list('following', flat=True)
-            # Get list of blocked user IDs
-            blocked_users = BlockedUser.objects.filter(blocker=request_user).values_list('blocked', flat=True)
-            # Filter out blocked users from followings list
-            followings = [following for following in followings if following not in blocked_users]
-            # Return profiles of all users being followed
-            profiles = Profile.objects.filter(user__in=followings)
-            cache.set(cache_key, profiles, timeout=60*15)  # Cache for 15 minutes
-            Profile.objects.filter(user__in=followings)
-            return profiles
-        except CustomUser.DoesNotExist:
-            return Profile.objects.none()
+
+class FollowingListAPIView(FollowListAPIView):
+    follow_list = follow_cache.FOLLOWING
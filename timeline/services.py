@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from posts.models import Post
+from profiles.models import Follow
+from users.blocks import get_block_set
+from vlogs.models import Vlog
+from . import store
+
+
+POST = 'post'
+VLOG = 'vlog'
+MODELS = {
+    POST: Post,
+    VLOG: Vlog,
+}
+
+
+def recent_entries(author_ids, viewer=None, before=None, limit=store.TIMELINE_MAX_LENGTH):
+    """
+    Return the newest (kind, item_id, score) entries written by `author_ids`,
+    skipping failed vlogs and the posts `viewer` has hidden.
+    """
+    entries = []
+    for kind, model in MODELS.items():
+        queryset = model.objects.filter(user_id__in=author_ids)
+        if kind == VLOG:
+            queryset = queryset.exclude(processing_status='failed')
+        elif viewer is not None:
+            queryset = queryset.exclude(hidden_by__user=viewer)
+        if before is not None:
+            queryset = queryset.filter(created_at__lt=datetime.fromtimestamp(before, tz=timezone.utc))
+        rows = queryset.order_by('-created_at').values_list('id', 'created_at')[:limit]
+        entries += [(kind, item_id, created_at.timestamp()) for item_id, created_at in rows]
+    return entries
+
+
+def rebuild(user):
+    """Materialize a user's timeline from the follow graph (fan-out-on-read fallback)."""
+    following = set(Follow.objects.filter(follower=user).values_list('following_id', flat=True))
+    authors = (following | {user.pk}) - get_block_set(user)
+    store.store(user.pk, recent_entries(authors, viewer=user))
+
+
+def add_author(user_id, author_id):
+    if store.exists(user_id):
+        store.add(user_id, recent_entries([author_id], viewer=user_id))
+
+
+def remove_author(user_id, author_id):
+    if not store.exists(user_id):
+        return
+    members = [
+        store.make_member(kind, item_id)
+        for kind, model in MODELS.items()
+        for item_id in model.objects.filter(user_id=author_id)
+        .order_by('-created_at').values_list('id', flat=True)[:store.TIMELINE_MAX_LENGTH]
+    ]
+    store.remove(user_id, members)
+
+
+def remove_item(user_id, kind, item_id):
+    store.remove(user_id, [store.make_member(kind, item_id)])
+
+
+def read_page(user, before=None, count=10):
+    """
+    Return `(items, next_before)` where items is a list of (kind, instance) newest first.
+
+    Stored entries come from one ZREVRANGEBYSCORE, entries of followed accounts that
+    are too large to fan out on write are merged in from the DB, and the instances
+    are then loaded with one bulk query per model.
+    """
+    if not store.exists(user.pk):
+        rebuild(user)
+    entries = store.read(user.pk, before=before, count=count)
+
+    celebrities = store.get_celebrities()
+    if celebrities:
+        followed = list(Follow.objects.filter(follower=user, following_id__in=celebrities).values_list('following_id', flat=True))
+        if followed:
+            entries += recent_entries(followed, viewer=user, before=before, limit=count)
+
+    unique = {(kind, item_id): score for kind, item_id, score in entries}
+    entries = sorted(unique.items(), key=lambda entry: entry[1], reverse=True)[:count]
+    next_before = entries[-1][1] if len(entries) == count else None
+
+    instances = {}
+    for kind, model in MODELS.items():
+        ids = [item_id for (entry_kind, item_id), _ in entries if entry_kind == kind]
+        if ids:
+            instances[kind] = model.objects.select_related('user', 'user__profile').in_bulk(ids)
+
+    block_set = get_block_set(user)
+    items = []
+    for (kind, item_id), _ in entries:
+        instance = instances.get(kind, {}).get(item_id)
+        # Deleted items and authors blocked since the fan-out are dropped on read
+        if instance is None or instance.user_id in block_set:
+            continue
+        if kind == VLOG and instance.processing_status == 'failed':
+            continue
+        items.append((kind, instance))
+    return items, next_before
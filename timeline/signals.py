@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from posts.models import Post, HiddenPost
+from profiles.models import Follow
+from users.models import BlockedUser
+from vlogs.models import Vlog
+from . import services
+from .tasks import fan_out_item
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_item.delay(services.POST, instance.pk))
+
+
+@receiver(post_save, sender=Vlog)
+def fan_out_vlog(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_item.delay(services.VLOG, instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_author(sender, instance, created, **kwargs):
+    if created and instance.follower_id and instance.following_id:
+        transaction.on_commit(lambda: services.add_author(instance.follower_id, instance.following_id))
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_author(sender, instance, **kwargs):
+    if instance.follower_id and instance.following_id:
+        transaction.on_commit(lambda: services.remove_author(instance.follower_id, instance.following_id))
+
+
+@receiver(post_save, sender=BlockedUser)
+def remove_blocked_authors(sender, instance, created, **kwargs):
+    def remove():
+        services.remove_author(instance.blocker_id, instance.blocked_id)
+        services.remove_author(instance.blocked_id, instance.blocker_id)
+
+    if created:
+        transaction.on_commit(remove)
+
+
+@receiver(post_save, sender=HiddenPost)
+def remove_hidden_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: services.remove_item(instance.user_id, services.POST, instance.post_id))
@@ -0,0 +1,107 @@
+from django_redis import get_redis_connection
+
+
+TIMELINE_MAX_LENGTH = 800
+# 1 week from when the timeline is built. Reads do not extend it, so an item pushed while a
+# concurrent rebuild replaced the timeline shows up at the latest when it is rebuilt again.
+TIMELINE_TIMEOUT = 60 * 60 * 24 * 7
+FANOUT_BATCH_SIZE = 1000
+# Authors with more followers than this are not fanned out on write, their items are merged in on read
+FANOUT_FOLLOWER_LIMIT = 10000
+CELEBRITIES_KEY = 'timeline_celebrities'
+# Keeps an empty timeline alive so it is not rebuilt on every read, always sorts below real entries
+SENTINEL = 'none:0'
+
+# Only append to timelines that are already materialized, the others are rebuilt from the DB on read
+_PUSH_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[2])
+        redis.call('ZREMRANGEBYRANK', key, 0, -tonumber(ARGV[3]) - 1)
+    end
+end
+return 1
+"""
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def timeline_key(user_id):
+    return f'timeline_{user_id}'
+
+
+def make_member(kind, item_id):
+    return f'{kind}:{item_id}'
+
+
+def parse_member(member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    kind, item_id = member.split(':', 1)
+    return kind, int(item_id)
+
+
+def push(user_ids, kind, item_id, score):
+    """Add an item to the stored timelines of `user_ids`."""
+    if not user_ids:
+        return
+    script = get_redis().register_script(_PUSH_SCRIPT)
+    script(keys=[timeline_key(user_id) for user_id in user_ids],
+           args=[score, make_member(kind, item_id), TIMELINE_MAX_LENGTH])
+
+
+def store(user_id, entries):
+    """Replace a user's timeline with `entries`, an iterable of (kind, item_id, score)."""
+    key = timeline_key(user_id)
+    mapping = {make_member(kind, item_id): score for kind, item_id, score in entries}
+    mapping[SENTINEL] = 0
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, mapping)
+    pipe.zremrangebyrank(key, 0, -TIMELINE_MAX_LENGTH - 1)
+    pipe.expire(key, TIMELINE_TIMEOUT)
+    pipe.execute()
+
+
+def add(user_id, entries):
+    """Merge (kind, item_id, score) entries into an existing timeline."""
+    mapping = {make_member(kind, item_id): score for kind, item_id, score in entries}
+    if not mapping:
+        return
+    key = timeline_key(user_id)
+    pipe = get_redis().pipeline()
+    pipe.zadd(key, mapping)
+    pipe.zremrangebyrank(key, 0, -TIMELINE_MAX_LENGTH - 1)
+    pipe.execute()
+
+
+def exists(user_id):
+    return bool(get_redis().exists(timeline_key(user_id)))
+
+
+def remove(user_id, members):
+    if members:
+        get_redis().zrem(timeline_key(user_id), *members)
+
+
+def read(user_id, before=None, count=10):
+    """
+    Return up to `count` (kind, item_id, score) entries older than the `before` score, newest first.
+    """
+    key = timeline_key(user_id)
+    max_score = f'({before}' if before is not None else '+inf'
+    members = get_redis().zrevrangebyscore(key, max_score, '(0', start=0, num=count, withscores=True)
+    return [(*parse_member(member), score) for member, score in members]
+
+
+def get_celebrities():
+    return {int(user_id) for user_id in get_redis().smembers(CELEBRITIES_KEY)}
+
+
+def set_celebrity(user_id, is_celebrity):
+    if is_celebrity:
+        get_redis().sadd(CELEBRITIES_KEY, user_id)
+    else:
+        get_redis().srem(CELEBRITIES_KEY, user_id)
@@ -0,0 +1,40 @@
+import logging
+from celery import shared_task
+from profiles.models import Follow
+from . import store
+from .services import MODELS
+
+logger = logging.getLogger('timeline')
+
+
+@shared_task
+def fan_out_item(kind, item_id):
+    """
+    Push a new post/vlog into the stored timelines of its author and followers,
+    walking the follow graph in batches. Authors above FANOUT_FOLLOWER_LIMIT are
+    only flagged, their items are merged into timelines on read.
+    """
+    item = MODELS[kind].objects.filter(pk=item_id).values('user_id', 'created_at').first()
+    if item is None:
+        return
+    author_id = item['user_id']
+    score = item['created_at'].timestamp()
+    store.push([author_id], kind, item_id, score)
+
+    followers = Follow.objects.filter(following_id=author_id)
+    is_celebrity = followers.count() > store.FANOUT_FOLLOWER_LIMIT
+    store.set_celebrity(author_id, is_celebrity)
+    if is_celebrity:
+        logger.info(f"Skipping fan-out of {kind} {item_id}, user {author_id} is fanned out on read")
+        return
+
+    last_id = 0
+    pushed = 0
+    while True:
+        batch = list(followers.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'follower_id')[:store.FANOUT_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        store.push([follower_id for _, follower_id in batch], kind, item_id, score)
+        pushed += len(batch)
+    logger.info(f"Fanned out {kind} {item_id} to {pushed} followers")
@@ -0,0 +1,42 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
+from posts.serializers import PostSerializer
+from vlogs.serializers import VlogSerializer
+from . import services
+
+
+class TimelineView(APIView):
+    """
+    Home timeline of the authenticated user: posts and vlogs of the accounts they follow, newest first.
+    """
+    permission_classes = [IsAuthenticated]
+    page_size = 10
+    max_page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', self.page_size)), self.max_page_size)
+            before = request.query_params.get('cursor')
+            before = float(before) if before is not None else None
+        except ValueError:
+            return Response({'error': 'Invalid limit or cursor.'}, status=400)
+        if limit < 1:
+            return Response({'error': 'Invalid limit or cursor.'}, status=400)
+
+        items, next_before = services.read_page(request.user, before=before, count=limit)
+
+        context = {'request': request}
+        posts = [instance for kind, instance in items if kind == services.POST]
+        vlogs = [instance for kind, instance in items if kind == services.VLOG]
+        data = {
+            services.POST: dict(zip([post.id for post in posts], PostSerializer(posts, many=True, context=context).data)),
+            services.VLOG: dict(zip([vlog.id for vlog in vlogs], VlogSerializer(vlogs, many=True, context=context).data)),
+        }
+        results = [{'type': kind, 'item': data[kind][instance.id]} for kind, instance in items]
+
+        next_url = None
+        if next_before is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', repr(next_before))
+        return Response({'next': next_url, 'results': results})
@@ -0,0 +1,196 @@
+"""
+Write-behind buffer for likes, enabled with the `LIKE_WRITE_BEHIND` setting.
+
+Taps are recorded in Redis: `likes_pending_{kind}_{item_id}` holds each user's unflushed
+state ('1'/'0'), `likes_count_{kind}` the item's like count while it has pending state and
+`likes_stream_{kind}` one entry per tap. `flush()` applies them to the DB in bulk and only
+then drops the applied state, so readers overlaying Redis on the DB see the same values
+before, during and after a flush.
+"""
+from collections import Counter
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django_redis import get_redis_connection
+from trend.response_cache import bump_version
+
+
+POST = 'post'
+VLOG = 'vlog'
+FLUSH_BATCH_SIZE = 1000
+FLUSH_LOCK_TIMEOUT = 60 * 5
+
+_TOGGLE_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[2]
+local new_state = state == '1' and '0' or '1'
+redis.call('HSET', KEYS[1], ARGV[1], new_state)
+if redis.call('HEXISTS', KEYS[2], ARGV[3]) == 0 then
+    redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+end
+redis.call('HINCRBY', KEYS[2], ARGV[3], new_state == '1' and 1 or -1)
+redis.call('XADD', KEYS[3], '*', 'item', ARGV[3], 'user', ARGV[1])
+return new_state
+"""
+
+# KEYS: counts hash, stream, then one pending hash per applied entry
+# ARGV: stream entry ids count, stream entry ids..., then (item, user, state) triples
+_CLEANUP_SCRIPT = """
+local entry_count = tonumber(ARGV[1])
+for i = 1, entry_count do
+    redis.call('XDEL', KEYS[2], ARGV[1 + i])
+end
+local offset = 1 + entry_count
+for i = 3, #KEYS do
+    local base = offset + (i - 3) * 3
+    local item, user, state = ARGV[base + 1], ARGV[base + 2], ARGV[base + 3]
+    if redis.call('HGET', KEYS[i], user) == state then
+        redis.call('HDEL', KEYS[i], user)
+    end
+    if redis.call('HLEN', KEYS[i]) == 0 then
+        redis.call('HDEL', KEYS[1], item)
+    end
+end
+return 1
+"""
+
+
+def is_enabled():
+    return getattr(settings, 'LIKE_WRITE_BEHIND', False)
+
+
+def pending_key(kind, item_id):
+    return f'likes_pending_{kind}_{item_id}'
+
+
+def counts_key(kind):
+    return f'likes_count_{kind}'
+
+
+def stream_key(kind):
+    return f'likes_stream_{kind}'
+
+
+def toggle(kind, item, user_id, is_liked_in_db):
+    """
+    Record a like/unlike tap of `user_id` on `item` and return the new liked state.
+    `is_liked_in_db` is only called when the user has no pending state for the item.
+    """
+    redis = get_redis_connection('default')
+    state = redis.hget(pending_key(kind, item.pk), user_id)
+    db_state = '0' if state is not None else ('1' if is_liked_in_db() else '0')
+    script = redis.register_script(_TOGGLE_SCRIPT)
+    new_state = script(keys=[pending_key(kind, item.pk), counts_key(kind), stream_key(kind)],
+                       args=[user_id, db_state, item.pk, item.likes_count])
+    return new_state in (b'1', '1')
+
+
+def pending_states(kind, user_id, item_ids):
+    """Return {item_id: liked} for the items the user has unflushed taps on."""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return {}
+    pipe = get_redis_connection('default').pipeline(transaction=False)
+    for item_id in item_ids:
+        pipe.hget(pending_key(kind, item_id), user_id)
+    return {item_id: state == b'1' for item_id, state in zip(item_ids, pipe.execute()) if state is not None}
+
+
+def buffered_counts(kind, item_ids):
+    """Return {item_id: likes_count} for the items whose count is held in Redis."""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return {}
+    counts = get_redis_connection('default').hmget(counts_key(kind), item_ids)
+    return {item_id: max(int(count), 0) for item_id, count in zip(item_ids, counts) if count is not None}
+
+
+def apply_to_instances(kind, instances, user=None, liked_ids=None):
+    """
+    Overlay buffered counts on `instances` and, when given, pending states of `user`
+    on the `liked_ids` set (both updated in place).
+    """
+    if not is_enabled():
+        return
+    ids = [instance.pk for instance in instances]
+    counts = buffered_counts(kind, ids)
+    for instance in instances:
+        if instance.pk in counts:
+            instance.likes_count = counts[instance.pk]
+    if user is not None and liked_ids is not None:
+        apply_pending(kind, user, ids, liked_ids)
+
+
+def apply_pending(kind, user, item_ids, liked_ids):
+    for item_id, liked in pending_states(kind, user.pk, item_ids).items():
+        if liked:
+            liked_ids.add(item_id)
+        else:
+            liked_ids.discard(item_id)
+
+
+def flush(kind, item_model, like_model, item_field, cache_namespace, batch_size=FLUSH_BATCH_SIZE):
+    """
+    Apply up to `batch_size` buffered taps of `kind` to the like table and counters.
+    Returns the number of stream entries consumed.
+    """
+    redis = get_redis_connection('default')
+    lock = redis.lock(f'likes_flush_lock_{kind}', timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        entries = redis.xrange(stream_key(kind), count=batch_size)
+        if not entries:
+            return 0
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pairs = list({(int(fields[b'item']), int(fields[b'user'])) for _, fields in entries})
+
+        pipe = redis.pipeline(transaction=False)
+        for item_id, user_id in pairs:
+            pipe.hget(pending_key(kind, item_id), user_id)
+        states = dict(zip(pairs, pipe.execute()))
+        desired = {pair: state == b'1' for pair, state in states.items() if state is not None}
+
+        item_column = f'{item_field}_id'
+        item_ids = {item_id for item_id, _ in desired}
+        user_ids = {user_id for _, user_id in desired}
+        with transaction.atomic():
+            # Items or users deleted since the tap are dropped from the buffer
+            live_items = set(item_model.objects.filter(pk__in=item_ids).values_list('pk', flat=True))
+            live_users = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+            existing = set(like_model.objects.filter(**{f'{item_column}__in': live_items, 'user_id__in': live_users})
+                           .values_list(item_column, 'user_id'))
+            to_create = [pair for pair, liked in desired.items()
+                         if liked and pair not in existing and pair[0] in live_items and pair[1] in live_users]
+            to_delete = [pair for pair, liked in desired.items() if not liked and pair in existing]
+
+            like_model.objects.bulk_create(
+                [like_model(**{item_column: item_id, 'user_id': user_id}) for item_id, user_id in to_create],
+                ignore_conflicts=True,
+            )
+            if to_delete:
+                like_model.objects.filter(
+                    reduce(or_, (Q(**{item_column: item_id, 'user_id': user_id}) for item_id, user_id in to_delete))
+                ).delete()
+
+            changes = Counter(item_id for item_id, _ in to_create)
+            changes.subtract(item_id for item_id, _ in to_delete)
+            for item_id, change in changes.items():
+                if change > 0:
+                    item_model.objects.filter(pk=item_id).update(likes_count=F('likes_count') + change)
+                elif change < 0:
+                    item_model.objects.filter(pk=item_id).update(likes_count=Greatest(F('likes_count') + change, 0))
+            if changes:
+                bump_version(cache_namespace)
+
+        # Only now that the DB holds the state, drop what was applied (unless re-tapped meanwhile)
+        applied = [(item_id, user_id, '1' if liked else '0') for (item_id, user_id), liked in desired.items()]
+        script = redis.register_script(_CLEANUP_SCRIPT)
+        script(keys=[counts_key(kind), stream_key(kind)] + [pending_key(kind, item_id) for item_id, _, _ in applied],
+               args=[len(entry_ids), *entry_ids] + [value for triple in applied for value in triple])
+        return len(entry_ids)
+    finally:
+        lock.release()
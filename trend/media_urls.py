@@ -0,0 +1,82 @@
+"""
+URLs of media objects in API responses.
+
+With `AWS_QUERYSTRING_AUTH` the bucket is private and every URL is a presigned GET from
+`S3.get_file`. A key is signed once per time bucket of URL_BUCKET seconds: the first URL
+signed in a bucket is kept in Redis (`media_url_{bucket}_{key}`) and in an in-process LRU
+until the bucket ends, so every response of the bucket carries the byte-identical URL and
+client and CDN caches keep hitting. URLs are signed for the bucket plus URL_GRACE seconds,
+so a URL stays usable for at least URL_GRACE seconds after it was last served.
+
+Without `AWS_QUERYSTRING_AUTH` the URLs are the public MEDIA_URL ones.
+"""
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin
+from django.conf import settings
+from django.core.cache import cache
+from trend.s3_utils import S3
+
+
+URL_BUCKET = 60 * 60  # 1 hour
+URL_GRACE = 60 * 60  # 1 hour
+LOCAL_CACHE_SIZE = 10000
+
+# key: (bucket, url), least recently used first
+_local_urls = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def signing_enabled():
+    return str(settings.AWS_QUERYSTRING_AUTH).lower() in ('true', '1')
+
+
+def url_cache_key(bucket, key):
+    return f'media_url_{bucket}_{key}'
+
+
+def media_urls(keys):
+    """{key: URL} of the non-empty `keys`, fetching or signing the missing ones in one batch."""
+    keys = {key for key in keys if key}
+    if not signing_enabled():
+        return {key: urljoin(settings.MEDIA_URL, key) for key in keys}
+
+    now = time.time()
+    bucket = int(now // URL_BUCKET)
+    urls = {}
+    with _local_lock:
+        for key in keys:
+            entry = _local_urls.get(key)
+            if entry is not None and entry[0] == bucket:
+                _local_urls.move_to_end(key)
+                urls[key] = entry[1]
+    missing = keys - urls.keys()
+    if not missing:
+        return urls
+
+    cached = cache.get_many([url_cache_key(bucket, key) for key in missing])
+    timeout = max(1, int((bucket + 1) * URL_BUCKET - now))
+    s3 = S3()
+    for key in missing:
+        url = cached.get(url_cache_key(bucket, key))
+        if url is None:
+            url = s3.get_file(key, time=URL_BUCKET + URL_GRACE)
+            # Another process may have signed the key concurrently, everyone serves the first URL stored
+            if not cache.add(url_cache_key(bucket, key), url, timeout=timeout):
+                url = cache.get(url_cache_key(bucket, key)) or url
+        urls[key] = url
+    with _local_lock:
+        for key in missing:
+            _local_urls[key] = (bucket, urls[key])
+            _local_urls.move_to_end(key)
+        while len(_local_urls) > LOCAL_CACHE_SIZE:
+            _local_urls.popitem(last=False)
+    return urls
+
+
+def media_url(key):
+    """URL of the media object `key`, None for an empty key."""
+    if not key:
+        return None
+    return media_urls([key])[key]
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+LIST_CACHE_TIMEOUT = 60 * 5  # 5 minutes, stale pages are normally retired earlier by a version bump
+
+
+def version_cache_key(namespace):
+    return f'{namespace}_list_version'
+
+
+def get_version(namespace):
+    key = version_cache_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(namespace):
+    """Retire every cached page of `namespace` once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(version_cache_key(namespace))
+        except ValueError:
+            cache.add(version_cache_key(namespace), 1, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+class VersionedListCacheMixin:
+    """
+    Cache the serialized page body of a list view once per version of `cache_namespace`,
+    shared by every viewer. The body is built from the viewer-independent `get_queryset()`
+    and serialized without a request in the context, `apply_viewer_overlay()` then adds
+    the per-viewer parts (liked flags, block filtering) to the cached body on every request.
+    Model signals call `bump_version(cache_namespace)` on writes so counts are never stale.
+    """
+    cache_namespace = None
+    cache_timeout = LIST_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        cache_key = self.get_page_cache_key(request)
+        body = cache.get(cache_key)
+        if body is None:
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            serializer = self.get_serializer_class()(page, many=True)
+            body = dict(self.get_paginated_response(list(serializer.data)).data)
+            cache.set(cache_key, body, timeout=self.cache_timeout)
+        return Response(self.apply_viewer_overlay(request, body))
+
+    def get_page_cache_key(self, request):
+        version = get_version(self.cache_namespace)
+        page_size = self.paginator.get_page_size(request)
+        cursor = request.query_params.get(self.paginator.cursor_query_param, '')
+        return f'{self.cache_namespace}_list_v{version}_{page_size}_{cursor}'
+
+    def apply_viewer_overlay(self, request, body):
+        return body
@@ -16,9 +16,62 @@ class S3:
         return s3_client.generate_presigned_url(ClientMethod='put_object', ExpiresIn=time,
                                                 Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key})
 
+    def get_presigned_post(self, key, content_type, max_size, min_size=1, time=3600):
+        """
+        Presigned POST policy: S3 itself rejects bodies outside [min_size, max_size] bytes
+        or with another Content-Type, before anything is stored.
+        """
+        return s3_client.generate_presigned_post(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, ExpiresIn=time,
+                                                 Fields={'Content-Type': content_type},
+                                                 Conditions=[['content-length-range', min_size, max_size],
+                                                             {'Content-Type': content_type}])
+
     def get_file(self, key, time=3600):
         return s3_client.generate_presigned_url(ClientMethod='get_object', ExpiresIn=time,
                                                 Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key})
 
+    def upload_file(self, key, body, content_type, cache_control='public, max-age=31536000, immutable'):
+        extra = {'CacheControl': cache_control} if cache_control else {}
+        return s3_client.put_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, Body=body,
+                                    ContentType=content_type, **extra)
+
+    def head_file(self, key):
+        return s3_client.head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+
+    def read_file(self, key):
+        return s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)['Body'].read()
+
     def delete_file(self, key):
         return s3_client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+
+    def list_files(self, prefix=''):
+        """Yield the objects under `prefix` ({Key, LastModified, Size, ...}), one listing page at a time."""
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=prefix):
+            yield from page.get('Contents', [])
+
+    def delete_files(self, keys):
+        """Delete up to 1000 keys in one request, returns the errors S3 reported per key."""
+        response = s3_client.delete_objects(Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                                            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+        return response.get('Errors', [])
+
+    # Multipart uploads, see uploads.sessions
+    def create_multipart_upload(self, key, content_type):
+        return s3_client.create_multipart_upload(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key,
+                                                 ContentType=content_type)['UploadId']
+
+    def get_presigned_part_url(self, key, upload_id, part_number, time=3600):
+        return s3_client.generate_presigned_url(ClientMethod='upload_part', ExpiresIn=time,
+                                                Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key,
+                                                        'UploadId': upload_id, 'PartNumber': part_number})
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        """`parts` maps part numbers to the ETags S3 returned for them."""
+        return s3_client.complete_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in sorted(parts.items())]},
+        )
+
+    def abort_multipart_upload(self, key, upload_id):
+        return s3_client.abort_multipart_upload(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, UploadId=upload_id)
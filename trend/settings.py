@@ -48,6 +48,8 @@ INSTALLED_APPS = [
     'posts',
     'vlogs',
     'uploads',
+    'timeline',
+    'deletions',
     # 3rd-party apps
     'rest_framework',
     'rest_framework_simplejwt',
@@ -244,6 +246,97 @@ INTERNAL_IPS = [
 CELERY_BROKER_URL = f"{os.getenv('BASE_REDIS_URI', 'redis://:rania.dev@redis:6379')}/0"
 CELERY_RESULT_BACKEND = f"{os.getenv('BASE_REDIS_URI', 'redis://:rania.dev@redis:6379')}/0"
 
+# Queues, each consumed by its own worker type (see docker-compose.yml):
+# media: ffmpeg work, prefork with low concurrency and prefetch 1
+# default: light DB tasks (profiles, counters, timelines)
+# io: network bound tasks (email, S3 deletes), gevent pool
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'vlogs.tasks.process_video_validation': {'queue': 'media'},
+    'users.tasks.create_profile_for_new_user': {'queue': 'default'},
+    'users.tasks.update_profile_avatar': {'queue': 'default'},
+    'users.tasks.send_password_reset_email_task': {'queue': 'io'},
+    'uploads.tasks.delete_s3_file': {'queue': 'io'},
+    'uploads.tasks.delete_s3_files': {'queue': 'io'},
+    # Pages through the DB with the synchronous ORM, which would block the gevent pool of io
+    'uploads.tasks.collect_orphan_media': {'queue': 'default'},
+    'deletions.tasks.run_deletion_job': {'queue': 'default'},
+    'deletions.tasks.resume_deletion_jobs': {'queue': 'default'},
+}
+# Soft limits raise SoftTimeLimitExceeded inside the task, the hard limit kills it shortly after.
+# Limits are set per task, there is no global limit that would cut long tasks short.
+CELERY_TASK_ANNOTATIONS = {
+    'vlogs.tasks.process_video_validation': {'soft_time_limit': 60 * 15, 'time_limit': 60 * 16},
+    'vlogs.tasks.sweep_stuck_vlog_tasks': {'soft_time_limit': 60 * 5, 'time_limit': 60 * 6},
+    'users.tasks.create_profile_for_new_user': {'soft_time_limit': 10, 'time_limit': 20},
+    'users.tasks.update_profile_avatar': {'soft_time_limit': 10, 'time_limit': 20},
+    'users.tasks.send_password_reset_email_task': {'soft_time_limit': 30, 'time_limit': 45},
+    'uploads.tasks.delete_s3_file': {'soft_time_limit': 30, 'time_limit': 45},
+    'uploads.tasks.delete_s3_files': {'soft_time_limit': 60, 'time_limit': 90},
+    'posts.tasks.reconcile_post_counters': {'soft_time_limit': 60 * 10, 'time_limit': 60 * 11},
+    'vlogs.tasks.reconcile_vlog_counters': {'soft_time_limit': 60 * 10, 'time_limit': 60 * 11},
+    'posts.tasks.flush_post_likes': {'soft_time_limit': 60, 'time_limit': 90},
+    'vlogs.tasks.flush_vlog_likes': {'soft_time_limit': 60, 'time_limit': 90},
+    'posts.tasks.recompute_trending_posts': {'soft_time_limit': 60 * 5, 'time_limit': 60 * 6},
+    'vlogs.tasks.recompute_trending_vlogs': {'soft_time_limit': 60 * 5, 'time_limit': 60 * 6},
+    'timeline.tasks.fan_out_item': {'soft_time_limit': 60 * 5, 'time_limit': 60 * 6},
+    'uploads.tasks.collect_orphan_media': {'soft_time_limit': 60 * 60 * 2, 'time_limit': 60 * 60 * 2 + 60},
+    'deletions.tasks.run_deletion_job': {'soft_time_limit': 60, 'time_limit': 90},
+    'deletions.tasks.resume_deletion_jobs': {'soft_time_limit': 60, 'time_limit': 90},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Buffer like/unlike taps in Redis and write them to the DB in batches every LIKE_FLUSH_INTERVAL seconds
+LIKE_WRITE_BEHIND = os.getenv('LIKE_WRITE_BEHIND', 'False') == 'True'
+LIKE_FLUSH_INTERVAL = int(os.getenv('LIKE_FLUSH_INTERVAL', '5'))
+
+# Daily garbage collection of unreferenced media (uploads.gc), only reporting until MEDIA_GC_DRY_RUN is turned off
+MEDIA_GC_DRY_RUN = os.getenv('MEDIA_GC_DRY_RUN', 'True') == 'True'
+MEDIA_GC_GRACE_HOURS = int(os.getenv('MEDIA_GC_GRACE_HOURS', '24'))
+MEDIA_GC_MAX_DELETES_PER_SECOND = int(os.getenv('MEDIA_GC_MAX_DELETES_PER_SECOND', '500'))
+
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-post-counters': {
+        'task': 'posts.tasks.reconcile_post_counters',
+        'schedule': timedelta(hours=1),
+    },
+    'reconcile-vlog-counters': {
+        'task': 'vlogs.tasks.reconcile_vlog_counters',
+        'schedule': timedelta(hours=1),
+    },
+    'recompute-trending-posts': {
+        'task': 'posts.tasks.recompute_trending_posts',
+        'schedule': timedelta(minutes=5),
+    },
+    'recompute-trending-vlogs': {
+        'task': 'vlogs.tasks.recompute_trending_vlogs',
+        'schedule': timedelta(minutes=5),
+    },
+    'sweep-stuck-vlog-tasks': {
+        'task': 'vlogs.tasks.sweep_stuck_vlog_tasks',
+        'schedule': timedelta(minutes=1),
+    },
+    'collect-orphan-media': {
+        'task': 'uploads.tasks.collect_orphan_media',
+        'schedule': timedelta(days=1),
+    },
+    'resume-deletion-jobs': {
+        'task': 'deletions.tasks.resume_deletion_jobs',
+        'schedule': timedelta(minutes=5),
+    },
+}
+if LIKE_WRITE_BEHIND:
+    CELERY_BEAT_SCHEDULE.update({
+        'flush-post-likes': {
+            'task': 'posts.tasks.flush_post_likes',
+            'schedule': timedelta(seconds=LIKE_FLUSH_INTERVAL),
+        },
+        'flush-vlog-likes': {
+            'task': 'vlogs.tasks.flush_vlog_likes',
+            'schedule': timedelta(seconds=LIKE_FLUSH_INTERVAL),
+        },
+    })
+
 # CELERY_BROKER_URL = 'redis://localhost:6379/0'
 # CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
@@ -273,6 +366,8 @@ DEFAULT_FILE_STORAGE = 'trend.storages.MediaStorage'
 AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN', f'{AWS_STORAGE_BUCKET_NAME}.minio:9000')
 STATIC_URL = os.getenv('STATIC_URL', f'https://{AWS_S3_CUSTOM_DOMAIN}/')
 MEDIA_URL = os.getenv('MEDIA_URL', f'https://{AWS_S3_CUSTOM_DOMAIN}/')
+# Absolute base of the API's own URLs handed to clients (signed HLS playlists), host-relative when empty
+API_URL = os.getenv('API_URL', '')
 
 
 # Email configs
@@ -0,0 +1,15 @@
+"""
+Soft deletion of posts, vlogs, profiles and users.
+
+`deletions.services` only sets `deleted_at` in the request: the default `objects` manager
+hides the row from every queryset from then on, while `all_objects` still sees it so
+`deletions.tasks` can remove its dependent rows and media in batches before deleting the
+row itself. Related object access (`comment.post`) goes through the unfiltered base manager
+and keeps resolving in the meantime.
+"""
+from django.db import models
+
+
+class SoftDeleteManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
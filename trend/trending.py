@@ -0,0 +1,77 @@
+"""
+Trending ranking for posts and vlogs.
+
+Engagement is counted per item in hourly Redis buckets (`trending_{kind}_{hour}` sorted sets,
+weighted by event type). `recompute()` runs from Celery beat and merges the buckets of the
+last TRENDING_WINDOW_HOURS with one ZUNIONSTORE, each bucket weighted by its age
+(half-life decay), into `trending_{kind}`. Reads are a ZREVRANGE on that set.
+"""
+import time
+from django_redis import get_redis_connection
+
+
+POST = 'post'
+VLOG = 'vlog'
+
+LIKE = 'like'
+COMMENT = 'comment'
+VIEW = 'view'
+EVENT_WEIGHTS = {
+    LIKE: 1.0,
+    COMMENT: 2.0,
+    VIEW: 0.1,
+}
+
+TRENDING_WINDOW_HOURS = 48
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_MAX_LENGTH = 1000
+BUCKET_TIMEOUT = (TRENDING_WINDOW_HOURS + 1) * 60 * 60
+
+
+def current_hour():
+    return int(time.time() // 3600)
+
+
+def bucket_key(kind, hour):
+    return f'trending_{kind}_{hour}'
+
+
+def trending_key(kind):
+    return f'trending_{kind}'
+
+
+def record(kind, item_id, event):
+    """Count one engagement event of `item_id` in the current hour's bucket."""
+    key = bucket_key(kind, current_hour())
+    pipe = get_redis_connection('default').pipeline(transaction=False)
+    pipe.zincrby(key, EVENT_WEIGHTS[event], item_id)
+    pipe.expire(key, BUCKET_TIMEOUT)
+    pipe.execute()
+
+
+def recompute(kind):
+    """Rebuild `trending_{kind}` from the hourly buckets, returns the number of ranked items."""
+    redis = get_redis_connection('default')
+    hour = current_hour()
+    weights = {
+        bucket_key(kind, hour - age): 0.5 ** (age / TRENDING_HALF_LIFE_HOURS)
+        for age in range(TRENDING_WINDOW_HOURS)
+    }
+    key = trending_key(kind)
+    tmp_key = f'{key}_tmp'
+    ranked = redis.zunionstore(tmp_key, weights, aggregate='SUM')
+    if not ranked:
+        redis.delete(key)
+        return 0
+    pipe = redis.pipeline()
+    pipe.zremrangebyrank(tmp_key, 0, -TRENDING_MAX_LENGTH - 1)
+    pipe.rename(tmp_key, key)
+    pipe.execute()
+    return min(ranked, TRENDING_MAX_LENGTH)
+
+
+def read(kind, offset=0, count=10):
+    """Return up to `count` item ids of the trending ranking starting at rank `offset`."""
+    members = get_redis_connection('default').zrevrange(trending_key(kind), offset, offset + count - 1)
+    return [int(member) for member in members]
+
@@ -49,6 +49,7 @@ urlpatterns = [
     path('', include('posts.urls')),
     path('', include('vlogs.urls')),
     path('', include('uploads.urls')),
+    path('', include('timeline.urls')),
 
 
 
@@ -0,0 +1,39 @@
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from users.blocks import get_block_set
+from . import trending
+
+
+class TrendingListView(generics.GenericAPIView):
+    """
+    Page through the trending ranking of `trending_kind`, see `trend.trending`. Ids come from
+    Redis, the items from one bulk query on `queryset`; deleted, filtered out and blocked
+    items are skipped.
+    """
+    permission_classes = [IsAuthenticated]
+    trending_kind = None
+    page_size = 10
+    max_page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', self.page_size)), self.max_page_size)
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'Invalid limit or offset.'}, status=400)
+        if limit < 1 or offset < 0:
+            return Response({'error': 'Invalid limit or offset.'}, status=400)
+
+        ids = trending.read(self.trending_kind, offset=offset, count=limit)
+        instances = self.get_queryset().in_bulk(ids)
+        block_set = get_block_set(request.user)
+        items = [instances[item_id] for item_id in ids
+                 if item_id in instances and instances[item_id].user_id not in block_set]
+        data = self.get_serializer(items, many=True).data
+
+        next_url = None
+        if len(ids) == limit:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({'next': next_url, 'results': data})
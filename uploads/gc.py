@@ -0,0 +1,132 @@
+"""
+Garbage collection of media objects that no row references anymore.
+
+Presigned uploads that never became a post, vlog or profile, replaced avatars and
+backgrounds, and the media `deletions` could not purge stay in the bucket. `collect()`
+builds the set of keys the DB references, streams the bucket listing page by page and
+deletes, in `delete_objects` batches of DELETE_BATCH_SIZE keys, the unreferenced objects
+older than the grace period. The grace period covers uploads whose row is not created yet
+and vlogs still being processed (HLS segments are only referenced once the playlist is
+published).
+
+The scheduled run (`uploads.tasks.collect_orphan_media`) works through the DB on the default
+queue and hands every batch to `uploads.tasks.delete_s3_files` on the io queue instead,
+spaced out by countdowns to keep the rate limit.
+"""
+import os
+import time
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from posts.models import Post
+from profiles.models import Profile
+from trend.s3_utils import S3
+from users.models import CustomUser
+from vlogs.models import MediaDigest, Vlog
+
+logger = logging.getLogger('uploads')
+
+
+GC_PREFIX = 'media/'
+DELETE_BATCH_SIZE = 1000  # S3 maximum per delete_objects request
+INDEX_CHUNK_SIZE = 2000
+REPORT_SAMPLE_SIZE = 20
+
+
+def storage_key(name):
+    # Names of ImageFields are relative to MediaStorage's location
+    return f'media/{name}' if name else None
+
+
+def referenced_keys():
+    """Keys referenced by the DB, and the prefixes of referenced HLS renditions."""
+    keys = set()
+    prefixes = set()
+
+    def values(queryset, *fields):
+        return queryset.values_list(*fields).iterator(chunk_size=INDEX_CHUNK_SIZE)
+
+    def add_derivatives(thumbnail, thumbnails, playlist_key):
+        keys.add(storage_key(thumbnail))
+        keys.update(key for formats in (thumbnails or {}).values() for key in formats.values())
+        if playlist_key:
+            # Renditions and segments sit next to the master playlist
+            prefixes.add(os.path.dirname(playlist_key) + '/')
+
+    for image_key, image in values(Post.objects.all(), 'image_key', 'image'):
+        keys.update((str(image_key), storage_key(image)))
+    for avatar_key, background_pic_key in values(Profile.objects.all(), 'avatar_key', 'background_pic_key'):
+        keys.update((avatar_key, background_pic_key))
+    for (avatar_key,) in values(CustomUser.objects.all(), 'avatar_key'):
+        keys.add(avatar_key)
+    for vlog_key, *derivatives in values(Vlog.objects.all(), 'vlog_key', 'thumbnail', 'thumbnails', 'playlist_key'):
+        keys.add(vlog_key)
+        add_derivatives(*derivatives)
+    # Derivatives indexed for reuse are kept as long as their MediaDigest entry
+    for derivatives in values(MediaDigest.objects.all(), 'thumbnail', 'thumbnails', 'playlist_key'):
+        add_derivatives(*derivatives)
+    keys.discard(None)
+    keys.discard('')
+    return keys, prefixes
+
+
+def is_referenced(key, keys, prefixes):
+    return key in keys or os.path.dirname(key) + '/' in prefixes
+
+
+def collect(prefix=GC_PREFIX, grace=None, dry_run=True, max_deletes_per_second=None, defer_deletes=False):
+    """
+    Delete the unreferenced objects under `prefix` last modified more than `grace` ago, at
+    most `max_deletes_per_second` keys per second. With `dry_run` only report them, with
+    `defer_deletes` enqueue the batches to `delete_s3_files` rather than deleting them here.
+    """
+    grace = grace if grace is not None else timedelta(hours=settings.MEDIA_GC_GRACE_HOURS)
+    max_deletes_per_second = max_deletes_per_second or settings.MEDIA_GC_MAX_DELETES_PER_SECOND
+    # Objects modified after this are never deleted, including the ones uploaded while the index is built
+    cutoff = timezone.now() - grace
+    keys, prefixes = referenced_keys()
+    report = {'dry_run': dry_run, 'listed': 0, 'orphans': 0, 'orphan_bytes': 0, 'deleted': 0, 'queued': 0, 'errors': 0,
+              'sample': []}
+    s3 = S3()
+    batch = []
+    next_delete_at = 0
+    countdown = 0
+
+    def delete_batch():
+        nonlocal next_delete_at, countdown
+        if defer_deletes:
+            from .tasks import delete_s3_files
+            delete_s3_files.apply_async((list(batch),), countdown=countdown)
+            countdown += len(batch) / max_deletes_per_second
+            report['queued'] += len(batch)
+            batch.clear()
+            return
+        time.sleep(max(0, next_delete_at - time.monotonic()))
+        errors = s3.delete_files(batch)
+        next_delete_at = time.monotonic() + len(batch) / max_deletes_per_second
+        for error in errors:
+            logger.warning(f"Could not delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        report['deleted'] += len(batch) - len(errors)
+        report['errors'] += len(errors)
+        batch.clear()
+
+    for obj in s3.list_files(prefix):
+        report['listed'] += 1
+        if obj['LastModified'] >= cutoff or is_referenced(obj['Key'], keys, prefixes):
+            continue
+        report['orphans'] += 1
+        report['orphan_bytes'] += obj['Size']
+        if len(report['sample']) < REPORT_SAMPLE_SIZE:
+            report['sample'].append(obj['Key'])
+        if not dry_run:
+            batch.append(obj['Key'])
+            if len(batch) == DELETE_BATCH_SIZE:
+                delete_batch()
+    if batch:
+        delete_batch()
+
+    logger.info(f"Media GC{' (dry run)' if dry_run else ''}: listed {report['listed']} objects, "
+                f"{report['orphans']} orphans ({report['orphan_bytes']} bytes), "
+                f"deleted {report['deleted']}, queued {report['queued']}, {report['errors']} errors")
+    return report
@@ -0,0 +1,28 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from uploads import gc
+
+
+class Command(BaseCommand):
+    help = 'Delete the media objects no post, vlog or profile references, older than the grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the orphans')
+        parser.add_argument('--prefix', default=gc.GC_PREFIX)
+        parser.add_argument('--grace-hours', type=int, default=settings.MEDIA_GC_GRACE_HOURS)
+        parser.add_argument('--max-deletes-per-second', type=int, default=settings.MEDIA_GC_MAX_DELETES_PER_SECOND)
+
+    def handle(self, *args, **options):
+        report = gc.collect(
+            prefix=options['prefix'], grace=timedelta(hours=options['grace_hours']), dry_run=options['dry_run'],
+            max_deletes_per_second=options['max_deletes_per_second'],
+        )
+        for key in report['sample']:
+            self.stdout.write(key)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        count = report['orphans'] if options['dry_run'] else report['deleted']
+        self.stdout.write(self.style.SUCCESS(
+            f"Listed {report['listed']} objects. {verb} {count} of {report['orphans']} orphans "
+            f"({report['orphan_bytes']} bytes), {report['errors']} errors"
+        ))
@@ -0,0 +1,88 @@
+"""
+Resumable upload sessions on top of S3 multipart uploads.
+
+A session is kept in Redis while it is open: `upload_session_{id}` holds the S3 key, the
+multipart upload id and the part layout, `upload_session_parts_{id}` the ETag of every part
+the client reported as uploaded. A client that loses its connection reads the session back,
+asks presigned URLs for the missing parts only and completes the upload once every part is
+in. Both keys expire with the session; S3 keeps the parts of an upload that is neither
+completed nor aborted, which the bucket lifecycle rule for incomplete multipart uploads
+cleans up.
+"""
+import math
+import uuid
+from django_redis import get_redis_connection
+
+
+SESSION_TIMEOUT = 60 * 60 * 24  # 1 day
+PART_SIZE = 8 * 1024 * 1024  # S3 requires at least 5 MB, except for the last part
+MAX_PARTS = 10000  # S3 maximum
+PART_URL_BATCH_SIZE = 20
+
+
+def session_key(session_id):
+    return f'upload_session_{session_id}'
+
+
+def parts_key(session_id):
+    return f'upload_session_parts_{session_id}'
+
+
+def part_size_for(size):
+    """Part size giving at most MAX_PARTS parts, a multiple of 1 MB."""
+    return max(PART_SIZE, math.ceil(size / MAX_PARTS / (1024 * 1024)) * 1024 * 1024)
+
+
+def create(user_id, file_key, upload_id, size, max_size):
+    part_size = part_size_for(size)
+    session = {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'file_key': file_key,
+        'upload_id': upload_id,
+        'size': size,
+        'max_size': max_size,
+        'part_size': part_size,
+        'parts_count': math.ceil(size / part_size),
+    }
+    pipe = get_redis_connection('default').pipeline()
+    pipe.hset(session_key(session['id']), mapping=session)
+    pipe.expire(session_key(session['id']), SESSION_TIMEOUT)
+    pipe.execute()
+    return session
+
+
+def get(session_id, user_id):
+    """The session if it exists and belongs to the user, else None."""
+    data = get_redis_connection('default').hgetall(session_key(session_id))
+    if not data:
+        return None
+    session = {field.decode(): value.decode() for field, value in data.items()}
+    for field in ('user_id', 'size', 'max_size', 'part_size', 'parts_count'):
+        session[field] = int(session[field])
+    if session['user_id'] != user_id:
+        return None
+    return session
+
+
+def uploaded_parts(session_id):
+    """{part number: ETag} of the parts reported as uploaded."""
+    parts = get_redis_connection('default').hgetall(parts_key(session_id))
+    return {int(number): etag.decode() for number, etag in parts.items()}
+
+
+def record_part(session_id, part_number, etag):
+    pipe = get_redis_connection('default').pipeline()
+    pipe.hset(parts_key(session_id), part_number, etag)
+    pipe.expire(parts_key(session_id), SESSION_TIMEOUT)
+    pipe.execute()
+
+
+def missing_parts(session, count=PART_URL_BATCH_SIZE):
+    uploaded = uploaded_parts(session['id'])
+    missing = (number for number in range(1, session['parts_count'] + 1) if number not in uploaded)
+    return [number for number, _ in zip(missing, range(count))]
+
+
+def delete(session_id):
+    get_redis_connection('default').delete(session_key(session_id), parts_key(session_id))
@@ -0,0 +1,33 @@
+import logging
+from celery import shared_task
+from trend.s3_utils import S3
+
+logger = logging.getLogger('uploads')
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def delete_s3_file(key):
+    S3().delete_file(key)
+    logger.info(f"Deleted {key} from S3")
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def delete_s3_files(keys):
+    """Delete up to 1000 keys with one `delete_objects` request."""
+    errors = S3().delete_files(keys)
+    for error in errors:
+        logger.warning(f"Could not delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+    logger.info(f"Deleted {len(keys) - len(errors)} of {len(keys)} keys from S3")
+    return len(errors)
+
+
+@shared_task
+def collect_orphan_media(dry_run=None):
+    """
+    Delete the media no row references, see `uploads.gc`. Dry run unless MEDIA_GC_DRY_RUN is off.
+    Runs on the default queue, the deletes themselves go to the io queue as `delete_s3_files`.
+    """
+    from django.conf import settings
+    from . import gc
+    dry_run = settings.MEDIA_GC_DRY_RUN if dry_run is None else dry_run
+    return gc.collect(dry_run=dry_run, defer_deletes=True)
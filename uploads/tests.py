@@ -1,3 +1,49 @@
+from unittest import mock
+from botocore.exceptions import ClientError
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import CustomUser
+from . import sessions
 
-# Create your tests here.
+
+class UploadSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('author', 'author@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = sessions.create(self.user.id, 'media/vlogs/a.mp4', 'upload-id', 20 * 1024 * 1024, 200 * 1024 * 1024)
+
+    def test_part_layout(self):
+        self.assertEqual((self.session['part_size'], self.session['parts_count']), (sessions.PART_SIZE, 3))
+        # Large files get larger parts to stay within MAX_PARTS
+        self.assertLessEqual(100 * 1024 ** 3 / sessions.part_size_for(100 * 1024 ** 3), sessions.MAX_PARTS)
+
+    def test_missing_parts(self):
+        sessions.record_part(self.session['id'], 2, '"etag-2"')
+        self.assertEqual(sessions.uploaded_parts(self.session['id']), {2: '"etag-2"'})
+        self.assertEqual(sessions.missing_parts(self.session), [1, 3])
+
+    def test_session_of_another_user_is_not_found(self):
+        other = CustomUser.objects.create_user('other', 'other@example.com', 'password')
+        self.assertIsNone(sessions.get(self.session['id'], other.id))
+
+    @mock.patch('uploads.views.S3')
+    def test_abort(self, S3):
+        response = self.client.delete(reverse('upload-session', args=[self.session['id']]))
+        self.assertEqual(response.status_code, 204)
+        S3.return_value.abort_multipart_upload.assert_called_once_with('media/vlogs/a.mp4', 'upload-id')
+        self.assertIsNone(sessions.get(self.session['id'], self.user.id))
+
+    @mock.patch('uploads.views.S3')
+    def test_abort_of_an_upload_s3_no_longer_has(self, S3):
+        S3.return_value.abort_multipart_upload.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchUpload', 'Message': 'The specified upload does not exist.'}}, 'AbortMultipartUpload',
+        )
+        response = self.client.delete(reverse('upload-session', args=[self.session['id']]))
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(sessions.get(self.session['id'], self.user.id))
+        response = self.client.delete(reverse('upload-session', args=[self.session['id']]))
+        self.assertEqual(response.status_code, 404)
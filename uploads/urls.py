@@ -1,6 +1,17 @@
 from django.urls import path
-from .views import GetPresignedURLAPIView
+from .views import (
+    BatchPresignedURLAPIView, GetPresignedURLAPIView, UploadSessionCompleteView, UploadSessionCreateView,
+    UploadSessionPartsView, UploadSessionPartView, UploadSessionView,
+)
 
 urlpatterns = [
     path('uploads/generate-presigned-url/', GetPresignedURLAPIView.as_view(), name='generate-presigned-url'),
+    path('uploads/generate-presigned-urls/', BatchPresignedURLAPIView.as_view(), name='generate-presigned-urls'),
+    path('uploads/sessions/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/sessions/<str:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+    path('uploads/sessions/<str:session_id>/parts/', UploadSessionPartsView.as_view(), name='upload-session-parts'),
+    path('uploads/sessions/<str:session_id>/parts/<int:part_number>/', UploadSessionPartView.as_view(),
+         name='upload-session-part'),
+    path('uploads/sessions/<str:session_id>/complete/', UploadSessionCompleteView.as_view(),
+         name='upload-session-complete'),
 ]
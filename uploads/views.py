@@ -1,29 +1,253 @@
+import logging
+from urllib.parse import urljoin
+from botocore.exceptions import ClientError
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
 from trend.s3_utils import S3
+from . import sessions
 import uuid
 
+logger = logging.getLogger('uploads')
+
+
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png']
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi']
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'mp4': 'video/mp4',
+    'mov': 'video/quicktime',
+    'avi': 'video/x-msvideo',
+}
+# type: (key prefix, allowed extensions, max size in bytes)
+UPLOAD_POLICIES = {
+    'avatar': ('media/avatars', IMAGE_EXTENSIONS, 5 * 1024 * 1024),
+    'background_pic': ('media/background_pics', IMAGE_EXTENSIONS, 10 * 1024 * 1024),
+    'post': ('media/posts', IMAGE_EXTENSIONS, 10 * 1024 * 1024),
+    'vlog': ('media/vlogs', VIDEO_EXTENSIONS, 200 * 1024 * 1024),  # vlogs.pipeline.MAX_SIZE
+}
+BATCH_MAX_FILES = 20
+
+
+def upload_error(file_type, file_extension):
+    """Error message for a file type and extension that cannot be uploaded, else None."""
+    if file_type not in UPLOAD_POLICIES:
+        return 'Invalid file type'
+    if file_extension not in UPLOAD_POLICIES[file_type][1]:
+        return 'Invalid or missing file extension'
+    return None
+
+
+def new_file_key(file_type, file_extension):
+    return f'{UPLOAD_POLICIES[file_type][0]}/{uuid.uuid4()}.{file_extension}'
+
+
+def presigned_upload(s3, file_type, file_extension, method):
+    """Key of a new file and its presigned upload, as returned by GetPresignedURLAPIView."""
+    max_size = UPLOAD_POLICIES[file_type][2]
+    # Generate the appropriate key based on file type and extension
+    file_key = new_file_key(file_type, file_extension)
+    if method == 'post':
+        presigned = s3.get_presigned_post(file_key, CONTENT_TYPES[file_extension], max_size)
+        return {'url': presigned['url'], 'fields': presigned['fields'], 'file_key': file_key, 'max_size': max_size}
+    return {'url': s3.get_presigned_url(file_key), 'file_key': file_key}
+
 
 class GetPresignedURLAPIView(APIView):
+    """
+    Return a presigned upload for the given `type` and `extension`.
+
+    With `method=post` the response is a presigned POST policy (`url` and form `fields`)
+    under which S3 rejects files over the type's size limit or with another content type,
+    otherwise a presigned PUT `url`.
+    """
 
     def get(self, request, *args, **kwargs):
         # Get the file type (avatar or background_pic) from query params
         file_type = request.query_params.get('type', 'avatar')
-        file_extension = request.query_params.get('extension')
-        ALLOWED_EXTENSIONS = ['jpg', 'jpeg', 'png', 'mp4', 'mov', 'avi']
-        if not file_extension or file_extension.lower() not in ALLOWED_EXTENSIONS:
-            return Response({'error': 'Invalid or missing file extension'}, status=400)
-        # Generate the appropriate key based on file type and extension
-        file_uuid = str(uuid.uuid4())
-        if file_type == 'background_pic':
-            file_key = f'media/background_pics/{file_uuid}.{file_extension.lower()}'
-        elif file_type == 'avatar':
-            file_key = f'media/avatars/{file_uuid}.{file_extension.lower()}'
-        elif file_type == 'vlog':
-            file_key = f'media/vlogs/{file_uuid}.{file_extension.lower()}'
-        elif file_type == 'post':
-            file_key = f'media/posts/{file_uuid}.{file_extension.lower()}'
+        file_extension = (request.query_params.get('extension') or '').lower()
+        method = request.query_params.get('method', 'put').lower()
+        error = upload_error(file_type, file_extension)
+        if error:
+            return Response({'error': error}, status=400)
+        if method not in ('put', 'post'):
+            return Response({'error': 'Invalid upload method'}, status=400)
+        return Response(presigned_upload(S3(), file_type, file_extension, method))
+
+
+class BatchPresignedURLAPIView(APIView):
+    """
+    Presigned uploads for up to BATCH_MAX_FILES files in one request: `files` is a list of
+    `{type, extension}` and `method` applies to all of them, as in GetPresignedURLAPIView.
+    Each entry also gets the presigned GET URL and the public (CDN) URL of its key, so the
+    client can show the files right after uploading them.
+
+    Presigning is local work: the S3 client is created once per process and signs every URL
+    in memory, without any request to S3.
+    """
+
+    def post(self, request, *args, **kwargs):
+        files = request.data.get('files')
+        method = str(request.data.get('method', 'put')).lower()
+        if not isinstance(files, list) or not files:
+            return Response({'error': 'files must be a non-empty list'}, status=400)
+        if len(files) > BATCH_MAX_FILES:
+            return Response({'error': f'At most {BATCH_MAX_FILES} files per request'}, status=400)
+        if method not in ('put', 'post'):
+            return Response({'error': 'Invalid upload method'}, status=400)
+        entries = []
+        for index, entry in enumerate(files):
+            if not isinstance(entry, dict):
+                return Response({'error': f'files[{index}]: Invalid entry'}, status=400)
+            file_type = entry.get('type', 'avatar')
+            file_extension = str(entry.get('extension') or '').lower()
+            error = upload_error(file_type, file_extension)
+            if error:
+                return Response({'error': f'files[{index}]: {error}'}, status=400)
+            entries.append((file_type, file_extension))
+
+        s3 = S3()
+        results = []
+        for file_type, file_extension in entries:
+            upload = presigned_upload(s3, file_type, file_extension, method)
+            upload['get_url'] = s3.get_file(upload['file_key'])
+            upload['cdn_url'] = urljoin(settings.MEDIA_URL, upload['file_key'])
+            results.append(upload)
+        return Response({'files': results})
+
+
+def session_response(session):
+    return {
+        'session_id': session['id'],
+        'file_key': session['file_key'],
+        'size': session['size'],
+        'part_size': session['part_size'],
+        'parts_count': session['parts_count'],
+        'uploaded_parts': sorted(sessions.uploaded_parts(session['id'])),
+    }
+
+
+class UploadSessionCreateView(APIView):
+    """
+    Start a resumable upload of `size` bytes for the given `type` and `extension`. The file is
+    uploaded in `parts_count` parts of `part_size` bytes (the last one being smaller), in any
+    order and in parallel, through the URLs of `UploadSessionPartsView`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        file_type = request.data.get('type', 'avatar')
+        file_extension = str(request.data.get('extension') or '').lower()
+        error = upload_error(file_type, file_extension)
+        if error:
+            return Response({'error': error}, status=400)
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid or missing file size'}, status=400)
+        max_size = UPLOAD_POLICIES[file_type][2]
+        if not 0 < size <= max_size:
+            return Response({'error': f'File size must be between 1 and {max_size} bytes'}, status=400)
+        file_key = new_file_key(file_type, file_extension)
+        upload_id = S3().create_multipart_upload(file_key, CONTENT_TYPES[file_extension])
+        session = sessions.create(request.user.id, file_key, upload_id, size, max_size)
+        return Response(session_response(session), status=201)
+
+
+class UploadSessionView(APIView):
+    """Read back an upload session to resume it, or abort it with DELETE."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = sessions.get(session_id, request.user.id)
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=404)
+        return Response(session_response(session))
+
+    def delete(self, request, session_id):
+        session = sessions.get(session_id, request.user.id)
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=404)
+        try:
+            S3().abort_multipart_upload(session['file_key'], session['upload_id'])
+        except ClientError as e:
+            # NoSuchUpload: already completed, aborted or expired. Otherwise the parts are left
+            # to the bucket lifecycle rule for incomplete multipart uploads
+            if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                logger.warning(f"Could not abort the multipart upload of {session['file_key']}: {e}")
+        sessions.delete(session_id)
+        return Response(status=204)
+
+
+class UploadSessionPartsView(APIView):
+    """
+    Presigned PUT URLs for a batch of parts: the comma separated `parts` numbers, or by default
+    the next parts not uploaded yet. The client reports the ETag S3 returns for each uploaded
+    part to `UploadSessionPartView`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = sessions.get(session_id, request.user.id)
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=404)
+        if request.query_params.get('parts'):
+            try:
+                numbers = sorted({int(number) for number in request.query_params['parts'].split(',')})
+            except ValueError:
+                return Response({'error': 'Invalid part numbers'}, status=400)
+            if len(numbers) > sessions.PART_URL_BATCH_SIZE:
+                return Response({'error': f'At most {sessions.PART_URL_BATCH_SIZE} parts per request'}, status=400)
+            if numbers[0] < 1 or numbers[-1] > session['parts_count']:
+                return Response({'error': 'Invalid part numbers'}, status=400)
         else:
-            return Response({'error': 'Invalid file type'}, status=400)    
-        url = S3().get_presigned_url(file_key)
-        return Response({'url': url, 'file_key': file_key})
+            numbers = sessions.missing_parts(session)
+        s3 = S3()
+        return Response({'parts': [
+            {'part_number': number, 'url': s3.get_presigned_part_url(session['file_key'], session['upload_id'], number)}
+            for number in numbers
+        ]})
+
+
+class UploadSessionPartView(APIView):
+    """Record the `etag` of an uploaded part."""
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, session_id, part_number):
+        session = sessions.get(session_id, request.user.id)
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=404)
+        etag = str(request.data.get('etag') or '')
+        if not 1 <= part_number <= session['parts_count'] or not etag:
+            return Response({'error': 'Invalid part number or missing etag'}, status=400)
+        sessions.record_part(session_id, part_number, etag)
+        return Response(status=204)
+
+
+class UploadSessionCompleteView(APIView):
+    """Assemble the uploaded parts into the final object and close the session."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        session = sessions.get(session_id, request.user.id)
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=404)
+        parts = sessions.uploaded_parts(session_id)
+        missing = sessions.missing_parts(session)
+        if missing:
+            return Response({'error': 'Some parts are not uploaded yet', 'missing_parts': missing}, status=400)
+        s3 = S3()
+        try:
+            s3.complete_multipart_upload(session['file_key'], session['upload_id'], parts)
+        except ClientError as e:
+            # e.g. InvalidPart when a reported ETag does not match the stored part, the client re-uploads it
+            return Response({'error': e.response['Error'].get('Message', str(e))}, status=400)
+        sessions.delete(session_id)
+        # Part URLs do not bound the part sizes, enforce the type's limit on the assembled object
+        if s3.head_file(session['file_key'])['ContentLength'] > session['max_size']:
+            s3.delete_file(session['file_key'])
+            return Response({'error': 'File size exceeds the limit.'}, status=400)
+        return Response({'file_key': session['file_key']})
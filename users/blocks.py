@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.db.models import Q
+from .models import BlockedUser
+
+
+BLOCK_SET_TIMEOUT = 60 * 60 * 24  # 1 day, invalidated on every block/unblock
+
+
+def block_set_cache_key(user_id):
+    return f'block_set_{user_id}'
+
+
+def get_block_set(user):
+    """
+    Return the ids of every user that `user` blocked or was blocked by.
+    The set is cached in Redis and rebuilt from a single query on a miss.
+    """
+    user_id = getattr(user, 'pk', user)
+    cache_key = block_set_cache_key(user_id)
+    block_set = cache.get(cache_key)
+    if block_set is None:
+        pairs = BlockedUser.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)).values_list('blocker_id', 'blocked_id')
+        block_set = {blocked_id if blocker_id == user_id else blocker_id for blocker_id, blocked_id in pairs}
+        cache.set(cache_key, block_set, timeout=BLOCK_SET_TIMEOUT)
+    return block_set
+
+
+def invalidate_block_set(*user_ids):
+    cache.delete_many([block_set_cache_key(user_id) for user_id in user_ids])
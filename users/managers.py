@@ -1,7 +1,8 @@
 from django.contrib.auth.models import BaseUserManager
+from trend.soft_delete import SoftDeleteManager
 
 
-class CustomUserManager(BaseUserManager):
+class CustomUserManager(SoftDeleteManager, BaseUserManager):
     def create_user(self, username, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
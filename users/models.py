@@ -3,7 +3,7 @@ import random
 import uuid
 from django.conf import settings
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from .managers import CustomUserManager
 
@@ -17,7 +17,10 @@ class CustomUser(AbstractUser):
     updated_at = models.DateTimeField(auto_now=True)
     last_otp = models.CharField(max_length=6, blank=True, null=True)
     otp_expiry = models.DateTimeField(blank=True, null=True)
+    # Set while `deletions.tasks` removes the account, see `trend.soft_delete`
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
     objects = CustomUserManager()
+    all_objects = models.Manager()
 
     class Meta:
         indexes = [
@@ -42,7 +45,8 @@ class BlockedUser(models.Model):
     def save(self, *args, **kwargs):
         from profiles.models import Follow
 
-        # Handle unfollow on block
-        Follow.objects.filter(follower=self.blocker, following=self.blocked).delete()
-        Follow.objects.filter(follower=self.blocked, following=self.blocker).delete()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Handle unfollow on block
+            Follow.objects.filter(follower=self.blocker, following=self.blocked).delete()
+            Follow.objects.filter(follower=self.blocked, following=self.blocker).delete()
+            super().save(*args, **kwargs)
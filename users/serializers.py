@@ -101,6 +101,8 @@ class BlockedUserSerializer(serializers.ModelSerializer):
         fields = ['blocked_profile']
 
     def get_blocked_profile(self, obj):
-        profiles = Profile.objects.filter(user__in=BlockedUser.objects.values_list('blocked', flat=True))
-        profile_dict = {profile.user.id: profile for profile in profiles}
-        return ProfileSerializer(profile_dict.get(obj.blocked.id), context=self.context).data
+        try:
+            profile = obj.blocked.profile
+        except Profile.DoesNotExist:
+            profile = None
+        return ProfileSerializer(profile, context=self.context).data
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .blocks import invalidate_block_set
+from .models import BlockedUser
+
+
+@receiver(post_save, sender=BlockedUser)
+@receiver(post_delete, sender=BlockedUser)
+def invalidate_block_sets(sender, instance, **kwargs):
+    # Drop the cached sets only once the change is visible to other connections
+    transaction.on_commit(lambda: invalidate_block_set(instance.blocker_id, instance.blocked_id))
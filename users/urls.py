@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import BlockUserView, BlockedListView, RegisterUserAPIView, LoginView, PasswordResetRequestView, CheckCodeView, ConfirmPasswordView, UnblockUserView
+from .views import AccountDeleteView, BlockUserView, BlockedListView, RegisterUserAPIView, LoginView, PasswordResetRequestView, CheckCodeView, ConfirmPasswordView, UnblockUserView
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
@@ -11,6 +11,7 @@ urlpatterns = [
     path('password-reset/check-code/', CheckCodeView.as_view(), name='password-reset-check-code'),
     path('password-reset/confirm/', ConfirmPasswordView.as_view(), name='password-reset-confirm'),
     # blocking endpoints
+    path('users/me/', AccountDeleteView.as_view(), name='account-delete'),
     path('users/<int:user_id>/block/', BlockUserView.as_view(), name='user-block'),
     path('users/<int:user_id>/unblock/', UnblockUserView.as_view(), name='user-unblock'),
     path('users/blocked/', BlockedListView.as_view(), name='blocked-users-list'),
@@ -1,6 +1,4 @@
-from urllib.parse import urljoin
 import uuid
-from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -8,7 +6,9 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.throttling import AnonRateThrottle
 from rest_framework_simplejwt.tokens import RefreshToken
+from deletions.services import delete_user
 from profiles.pagination import CustomPageNumberPagination
+from trend.media_urls import media_url
 
 from .tasks import send_password_reset_email_task, create_profile_for_new_user
 from users.models import CustomUser, BlockedUser
@@ -55,7 +55,7 @@ class LoginView(APIView):
                     'user': {
                         'username': user.username,
                         'id': user.id,
-                        'avatar_url': urljoin(settings.MEDIA_URL, user.avatar_key) if user.avatar_key else None,
+                        'avatar_url': media_url(user.avatar_key),
                         'is_staff': user.is_staff,
                         'is_active': user.is_active,
                         'phone_number': user.phone_number,
@@ -105,6 +105,15 @@ class ConfirmPasswordView(APIView):
         return Response({"success": False, "message": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AccountDeleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request):
+        # The account is hidden and unusable right away, `deletions.tasks` removes what it owns
+        delete_user(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class BlockUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -138,6 +147,6 @@ class BlockedListView(APIView):
     pagination_class = CustomPageNumberPagination
 
     def get(self, request):
-        blocked_users = BlockedUser.objects.filter(blocker=request.user)
+        blocked_users = BlockedUser.objects.filter(blocker=request.user).select_related('blocked__profile')
         serializer = BlockedUserSerializer(blocked_users, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
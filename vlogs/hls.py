@@ -0,0 +1,96 @@
+"""
+Signed HLS playback from the private bucket.
+
+With `AWS_QUERYSTRING_AUTH` only presigned URLs can read the bucket, while the URIs inside
+the playlists ffmpeg writes are relative: a player given a presigned master playlist would
+be refused every variant playlist and segment. The playlists are therefore served by
+`VlogPlaylistView`, rewritten so that variant playlists point back to the view and segments
+to presigned URLs from `trend.media_urls`.
+
+The view is authorized by a token signed for the vlog and the `media_urls` time bucket it
+was issued in, so playlist URLs stay byte-identical through a bucket like every other media
+URL, and a token is accepted until URL_GRACE seconds after the end of its bucket. Rewritten
+playlists are cached for the rest of the bucket.
+"""
+import os
+import re
+import time
+from urllib.parse import urlencode, urljoin
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from trend.media_urls import URL_BUCKET, URL_GRACE, media_urls
+from trend.s3_utils import S3
+
+PLAYLIST_NAME = re.compile(r'^[\w-]+\.m3u8$')
+URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+signer = signing.Signer(salt='vlogs.hls')
+
+
+def current_bucket():
+    return int(time.time() // URL_BUCKET)
+
+
+def make_token(vlog_id, bucket=None):
+    return signer.sign(f'{vlog_id}.{current_bucket() if bucket is None else bucket}')
+
+
+def check_token(vlog_id, token):
+    try:
+        signed_id, _, bucket = signer.unsign(token).partition('.')
+    except signing.BadSignature:
+        return False
+    if signed_id != str(vlog_id) or not bucket.isdigit():
+        return False
+    return time.time() < (int(bucket) + 1) * URL_BUCKET + URL_GRACE
+
+
+def playlist_url(vlog_id, name, absolute=True):
+    """URL of the playlist `name` of the vlog served by `VlogPlaylistView`."""
+    url = f"{reverse('video-hls-playlist', args=[vlog_id, name])}?{urlencode({'token': make_token(vlog_id)})}"
+    return urljoin(settings.API_URL, url) if absolute else url
+
+
+def playlist_cache_key(bucket, vlog_id, name):
+    return f'hls_playlist_{bucket}_{vlog_id}_{name}'
+
+
+def signed_playlist(vlog_id, playlist_key, name):
+    """The playlist `name` next to the vlog's master playlist, with every URI signed."""
+    bucket = current_bucket()
+    cache_key = playlist_cache_key(bucket, vlog_id, name)
+    body = cache.get(cache_key)
+    if body is not None:
+        return body
+
+    prefix = os.path.dirname(playlist_key)
+    lines = S3().read_file(f'{prefix}/{name}').decode().splitlines()
+    uris = set()
+    for line in lines:
+        if line.startswith('#'):
+            uris.update(URI_ATTRIBUTE.findall(line))
+        elif line.strip():
+            uris.add(line.strip())
+    segments = [uri for uri in uris if not uri.endswith('.m3u8') and '://' not in uri]
+    urls = media_urls(f'{prefix}/{uri}' for uri in segments)
+
+    def signed(uri):
+        if '://' in uri:
+            return uri
+        if uri.endswith('.m3u8'):
+            # Resolved by the player against the URL of this playlist
+            return playlist_url(vlog_id, os.path.basename(uri), absolute=False)
+        return urls[f'{prefix}/{uri}']
+
+    rewritten = []
+    for line in lines:
+        if line.startswith('#'):
+            line = URI_ATTRIBUTE.sub(lambda match: f'URI="{signed(match.group(1))}"', line)
+        elif line.strip():
+            line = signed(line.strip())
+        rewritten.append(line)
+    body = '\n'.join(rewritten) + '\n'
+    cache.set(cache_key, body, timeout=max(1, int((bucket + 1) * URL_BUCKET - time.time())))
+    return body
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from vlogs.models import MediaDigest
+
+
+class Command(BaseCommand):
+    help = 'Show how many uploads reused indexed derivatives and how much processing time it saved'
+
+    def handle(self, *args, **options):
+        stats = MediaDigest.objects.aggregate(entries=Count('pk'), hits=Sum('hits'), saved=Sum('saved_seconds'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['entries']} indexed contents, {stats['hits'] or 0} reuses, "
+            f"{stats['saved'] or 0:.1f} seconds of processing saved"
+        ))
@@ -0,0 +1,377 @@
+"""
+Read video metadata and thumbnail frames without downloading the whole video.
+
+MP4/MOV files are probed by parsing their `moov` atom from HTTP range reads, which costs
+a couple of small requests wherever the atom sits in the file. Other containers go through
+ffprobe (or `ffmpeg -i` when ffprobe is not installed) reading the URL directly, which also
+only fetches what it needs to parse the headers. Thumbnail frames are decoded by ffmpeg
+seeking the input to the nearest keyframe.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import imageio_ffmpeg
+from PIL import Image, ImageFilter
+
+
+ISO_EXTENSIONS = ['mp4', 'mov', 'm4v']
+HEADER_READ_SIZE = 64 * 1024
+MAX_MOOV_SIZE = 32 * 1024 * 1024
+PROBE_TIMEOUT = 30  # seconds
+# Boxes holding the children we need, everything else inside moov is skipped
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+THUMBNAIL_TIME = 1  # seconds into the video
+FRAME_TIMEOUT = 60  # seconds
+# name: max width in pixels, the blur placeholder is a few hundred bytes meant to be upscaled by clients
+THUMBNAIL_SIZES = {
+    'card': 320,
+    'detail': 720,
+    'blur': 32,
+}
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+THUMBNAIL_QUALITY = 80
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60  # seconds without data
+# name: (short side, video bitrate in bits/s), renditions larger than the source are skipped
+HLS_RENDITIONS = {
+    '240p': (240, 400_000),
+    '480p': (480, 1_000_000),
+    '720p': (720, 2_500_000),
+}
+HLS_AUDIO_BITRATE = 96_000
+HLS_SEGMENT_SECONDS = 4
+# ffmpeg processes run at once per transcode, each already uses several threads
+HLS_MAX_PROCESSES = 2
+HLS_TIMEOUT = 60 * 10  # seconds per rendition
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+
+
+class ProbeError(Exception):
+    """Reading or processing the video failed, possibly for a transient reason (ffmpeg, storage)."""
+
+
+class InvalidMedia(ProbeError):
+    """The content itself is not a usable video, processing it again fails the same way."""
+
+
+def probe(url, extension):
+    """
+    Return the metadata of the video at `url`: `duration` (seconds), `size` (bytes),
+    `bitrate` (bits/s), `width`, `height`, `video_codec`, `audio_codec` and, for MP4/MOV,
+    `faststart` (whether the moov atom precedes the media data).
+    """
+    if extension.lower() in ISO_EXTENSIONS:
+        return probe_iso(url)
+    return probe_ffmpeg(url)
+
+
+def _read_range(url, start, end):
+    response = requests.get(url, headers={'Range': f'bytes={start}-{end}'}, timeout=PROBE_TIMEOUT)
+    # Storage errors are transient, unlike what the content turns out to be
+    response.raise_for_status()
+    if response.status_code not in (200, 206):
+        raise ProbeError(f"Range read of {start}-{end} failed with status {response.status_code}")
+    total = None
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        total = int(total) if total.isdigit() else None
+    elif response.status_code == 200:
+        total = len(response.content)
+    # A server ignoring the Range header sends the whole body
+    data = response.content if response.status_code == 206 else response.content[start:end + 1]
+    return data, total
+
+
+def _box_header(data, offset):
+    """Return (type, header size, box size) of the box at `offset`, size None when it runs to the end."""
+    size, box_type = struct.unpack_from('>I4s', data, offset)
+    if size == 1:
+        return box_type, 16, struct.unpack_from('>Q', data, offset + 8)[0]
+    return box_type, 8, size or None
+
+
+def _parse_moov(data):
+    info = {'duration': None, 'width': None, 'height': None, 'video_codec': None, 'audio_codec': None}
+
+    def walk(start, end, track):
+        offset = start
+        while offset + 8 <= end:
+            box_type, header, size = _box_header(data, offset)
+            size = size or end - offset
+            body = offset + header
+            if box_type == b'trak':
+                walk(body, offset + size, {})
+            elif box_type in CONTAINER_BOXES:
+                walk(body, offset + size, track)
+            elif box_type == b'mvhd':
+                version = data[body]
+                if version == 1:
+                    timescale, duration = struct.unpack_from('>IQ', data, body + 20)
+                else:
+                    timescale, duration = struct.unpack_from('>II', data, body + 12)
+                if timescale:
+                    info['duration'] = duration / timescale
+            elif box_type == b'tkhd':
+                # The box ends with the 3x3 transformation matrix then width and height in 16.16 fixed point
+                matrix_a, = struct.unpack_from('>i', data, offset + size - 44)
+                width, height = struct.unpack_from('>II', data, offset + size - 8)
+                track['width'], track['height'] = width >> 16, height >> 16
+                if matrix_a == 0:
+                    # Rotated by 90 or 270 degrees (phone portrait recordings), report the displayed size
+                    track['width'], track['height'] = track['height'], track['width']
+            elif box_type == b'hdlr':
+                track['handler'] = data[body + 8:body + 12]
+            elif box_type == b'stsd':
+                # Full box header, entry count, then the first sample entry's size and format
+                codec = data[body + 12:body + 16].decode('latin-1').strip()
+                if track.get('handler') == b'vide' and not info['video_codec']:
+                    info['video_codec'] = codec
+                    info['width'], info['height'] = track.get('width'), track.get('height')
+                elif track.get('handler') == b'soun' and not info['audio_codec']:
+                    info['audio_codec'] = codec
+            offset += size
+
+    walk(0, len(data), {})
+    return info
+
+
+def probe_iso(url):
+    """
+    Walk the top-level boxes reading only their headers until the moov atom, then fetch
+    and parse just that atom.
+    """
+    data, total = _read_range(url, 0, HEADER_READ_SIZE - 1)
+    if total is None:
+        raise ProbeError("Could not determine the file size")
+    buffer_start = 0
+    offset = 0
+    moov = moov_offset = mdat_offset = None
+    while offset + 8 <= total:
+        if offset + 16 > buffer_start + len(data):
+            data, _ = _read_range(url, offset, offset + HEADER_READ_SIZE - 1)
+            buffer_start = offset
+        box_type, _, size = _box_header(data, offset - buffer_start)
+        size = size or total - offset
+        if size < 8:
+            raise InvalidMedia(f"Corrupt box at offset {offset}")
+        if box_type == b'mdat' and mdat_offset is None:
+            mdat_offset = offset
+        elif box_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                raise InvalidMedia(f"moov atom of {size} bytes is too large")
+            if offset + size <= buffer_start + len(data):
+                moov = data[offset - buffer_start:offset - buffer_start + size]
+            else:
+                moov, _ = _read_range(url, offset, offset + size - 1)
+            moov_offset = offset
+            break
+        offset += size
+    if moov is None:
+        raise InvalidMedia("No moov atom found, not a valid MP4/MOV file")
+
+    info = _parse_moov(moov)
+    if not info['duration']:
+        raise InvalidMedia("Could not read the video duration")
+    info['size'] = total
+    info['bitrate'] = int(total * 8 / info['duration'])
+    info['faststart'] = mdat_offset is None or moov_offset < mdat_offset
+    return info
+
+
+def probe_ffmpeg(url):
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', url],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT,
+        )
+        if result.returncode != 0:
+            raise ProbeError(result.stderr.strip() or "ffprobe failed")
+        output = json.loads(result.stdout)
+        streams = output.get('streams', [])
+        video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+        audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+        fmt = output.get('format', {})
+        if abs(int(video.get('tags', {}).get('rotate', 0))) in (90, 270):
+            video['width'], video['height'] = video.get('height'), video.get('width')
+        info = {
+            'duration': float(fmt['duration']) if fmt.get('duration') else None,
+            'size': int(fmt['size']) if fmt.get('size') else None,
+            'bitrate': int(fmt['bit_rate']) if fmt.get('bit_rate') else None,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name'),
+        }
+    else:
+        # `ffmpeg -i` with no output reads the headers, prints them and exits with an error
+        result = subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-i', url],
+                                capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        info = _parse_ffmpeg_output(result.stderr)
+    if info['size'] is None:
+        info['size'] = os.path.getsize(url) if os.path.exists(url) else _read_range(url, 0, 0)[1]
+    if not info['duration']:
+        raise InvalidMedia("Could not read the video duration")
+    return info
+
+
+def _parse_ffmpeg_output(output):
+    info = {'duration': None, 'size': None, 'bitrate': None, 'width': None, 'height': None,
+            'video_codec': None, 'audio_codec': None}
+    duration = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', output)
+    if duration:
+        hours, minutes, seconds = duration.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    bitrate = re.search(r'bitrate: (\d+) kb/s', output)
+    if bitrate:
+        info['bitrate'] = int(bitrate.group(1)) * 1000
+    video = re.search(r'Stream #.*?: Video: (\w+)[^\n]*?, (\d{2,5})x(\d{2,5})', output)
+    if video:
+        info['video_codec'] = video.group(1)
+        info['width'], info['height'] = int(video.group(2)), int(video.group(3))
+    rotate = re.search(r'rotate\s*:\s*-?(\d+)', output)
+    if video and rotate and int(rotate.group(1)) in (90, 270):
+        info['width'], info['height'] = info['height'], info['width']
+    audio = re.search(r'Stream #.*?: Audio: (\w+)', output)
+    if audio:
+        info['audio_codec'] = audio.group(1)
+    return info
+
+
+def extract_frame(source, at=THUMBNAIL_TIME):
+    """
+    Decode a single frame of `source` (URL or path) as a PIL image. `-ss` before `-i` seeks
+    the input to the keyframe before `at`, so ffmpeg only reads and decodes around that point.
+    Videos shorter than `at` fall back to their first frame.
+    """
+    for position in (at, 0):
+        result = subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-ss', str(position), '-i', source,
+             '-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'png', '-'],
+            capture_output=True, timeout=FRAME_TIMEOUT,
+        )
+        if result.returncode == 0 and result.stdout:
+            return Image.open(io.BytesIO(result.stdout)).convert('RGB')
+    raise ProbeError(result.stderr.decode(errors='replace').strip() or "Could not extract a frame")
+
+
+def render_thumbnails(frame):
+    """Return {(size name, format name): (encoded bytes, content type)} for every thumbnail variant."""
+    thumbnails = {}
+    for size, max_width in THUMBNAIL_SIZES.items():
+        image = frame.copy()
+        image.thumbnail((max_width, max_width * 4))
+        if size == 'blur':
+            image = image.filter(ImageFilter.GaussianBlur(2))
+        for fmt, (pil_format, content_type) in THUMBNAIL_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, format=pil_format, quality=THUMBNAIL_QUALITY)
+            thumbnails[size, fmt] = (buffer.getvalue(), content_type)
+    return thumbnails
+
+
+def download(url, path, digest=None):
+    """Stream the object at `url` to `path`, feeding the bytes to the hashlib `digest` as they arrive."""
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+    return path
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remux_faststart(source, output):
+    """Copy the streams of `source` into `output` with the moov atom first, without re-encoding."""
+    result = subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+         '-map', '0', '-c', 'copy', '-movflags', '+faststart', output],
+        capture_output=True, timeout=HLS_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise ProbeError(f"Faststart remux failed: {result.stderr.decode(errors='replace').strip()}")
+    return output
+
+
+def hls_ladder(width, height):
+    """
+    Return [(name, width, height, bitrate)] of the renditions worth producing for a width x height
+    source. Rendition names refer to the short side so portrait videos get the same ladder.
+    """
+    short_side = min(width, height)
+    ladder = []
+    for name, (size, bitrate) in HLS_RENDITIONS.items():
+        if ladder and size > short_side:
+            break
+        # Keep the aspect ratio, H.264 needs even dimensions
+        scale = size / short_side
+        ladder.append((name, int(round(width * scale / 2)) * 2, int(round(height * scale / 2)) * 2, bitrate))
+    return ladder
+
+
+def _transcode_rendition(source, output_dir, name, width, height, bitrate):
+    segment_frames = f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})'
+    result = subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+         '-vf', f'scale={width}:{height}', '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+         # The main profile and HLS players only take 4:2:0, whatever the source's chroma subsampling
+         '-pix_fmt', 'yuv420p',
+         '-b:v', str(bitrate), '-maxrate', str(int(bitrate * 1.07)), '-bufsize', str(bitrate * 2),
+         '-force_key_frames', segment_frames, '-sc_threshold', '0',
+         '-c:a', 'aac', '-b:a', str(HLS_AUDIO_BITRATE), '-ac', '2',
+         '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+         '-hls_segment_filename', os.path.join(output_dir, f'{name}_%03d.ts'),
+         os.path.join(output_dir, f'{name}.m3u8')],
+        capture_output=True, timeout=HLS_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise ProbeError(f"Transcoding {name} failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+def transcode_hls(source, output_dir, width, height, on_progress=None):
+    """
+    Transcode `source` into an HLS ladder in `output_dir`, at most HLS_MAX_PROCESSES ffmpeg
+    processes at a time, and write the master playlist. Returns the master playlist file name.
+    `on_progress(done, total)` is called each time a rendition is finished.
+    """
+    ladder = hls_ladder(width, height)
+    with ThreadPoolExecutor(max_workers=HLS_MAX_PROCESSES) as executor:
+        futures = [executor.submit(_transcode_rendition, source, output_dir, *rendition) for rendition in ladder]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if on_progress is not None:
+                on_progress(done, len(ladder))
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for name, rendition_width, rendition_height, bitrate in ladder:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate + HLS_AUDIO_BITRATE},'
+                     f'RESOLUTION={rendition_width}x{rendition_height}')
+        lines.append(f'{name}.m3u8')
+    with open(os.path.join(output_dir, 'master.m3u8'), 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return 'master.m3u8'
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Vlog = apps.get_model('vlogs', 'Vlog')
+    Like = apps.get_model('vlogs', 'Like')
+    Comment = apps.get_model('vlogs', 'Comment')
+    likes = Like.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(c=Count('*')).values('c')
+    comments = Comment.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(c=Count('*')).values('c')
+    Vlog.objects.update(
+        likes_count=Coalesce(Subquery(likes), 0),
+        comments_count=Coalesce(Subquery(comments), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0010_vlog_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlog',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vlog',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0011_vlog_comments_count_vlog_likes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['vlog', 'created_at', 'id'], name='vlogs_comme_vlog_id_eca30e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vlog',
+            index=models.Index(fields=['created_at', 'id'], name='vlogs_vlog_created_eb5e71_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0012_comment_vlogs_comme_vlog_id_eca30e_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlog',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0013_vlog_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlog',
+            name='playlist_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
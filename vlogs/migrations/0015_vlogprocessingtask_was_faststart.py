@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0014_vlog_playlist_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='was_faststart',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
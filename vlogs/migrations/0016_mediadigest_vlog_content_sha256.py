@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0015_vlogprocessingtask_was_faststart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('thumbnails', models.JSONField(default=dict)),
+                ('thumbnail', models.CharField(max_length=255)),
+                ('playlist_key', models.CharField(max_length=255)),
+                ('processing_seconds', models.FloatField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('saved_seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vlog',
+            name='content_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
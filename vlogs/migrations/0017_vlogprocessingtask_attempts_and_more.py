@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:42
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_finished_at(apps, schema_editor):
+    # Jobs that already completed or failed are done, leave only the pending ones to the sweeper
+    VlogProcessingTask = apps.get_model('vlogs', 'VlogProcessingTask')
+    VlogProcessingTask.objects.exclude(status='pending').update(finished_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0016_mediadigest_vlog_content_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='queued_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='stage',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vlogprocessingtask',
+            index=models.Index(fields=['finished_at', 'heartbeat_at'], name='vlogs_vlogp_finishe_8d128f_idx'),
+        ),
+        migrations.RunPython(backfill_finished_at, migrations.RunPython.noop),
+    ]
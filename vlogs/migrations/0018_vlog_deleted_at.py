@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0017_vlogprocessingtask_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlog',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0018_vlog_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlogprocessingtask',
+            name='failed_stages',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vlogs', '0019_vlogprocessingtask_failed_stages'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['vlog', 'created_at', 'id'], name='vlogs_like_vlog_id_343cad_idx'),
+        ),
+    ]
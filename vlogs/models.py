@@ -1,4 +1,6 @@
 from django.db import models
+from django.utils import timezone
+from trend.soft_delete import SoftDeleteManager
 from users.models import CustomUser
 from django.core.validators import FileExtensionValidator
 
@@ -10,15 +12,29 @@ class Vlog(models.Model):
     description = models.TextField(blank=True, null=True)
     duration = models.DurationField(blank=True, null=True)
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
+    # {size: {format: key}} for the card/detail/blur thumbnails in WebP and JPEG
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # HLS master playlist, set once the renditions are uploaded
+    playlist_key = models.CharField(max_length=255, blank=True, null=True)
     processing_status = models.CharField(max_length=50, default='pending')
+    # SHA-256 of the uploaded content, see `MediaDigest`
+    content_sha256 = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # Denormalized counters, kept in sync with F() updates and reconciled by `vlogs.tasks.reconcile_vlog_counters`
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set while `deletions.tasks` removes the vlog, see `trend.soft_delete`
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
-    def comments_count(self):
-        return self.vlog_comments.count()
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
 
-    def likes_count(self):
-        return self.vlog_likes.count()
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def __str__(self):
         return self.title
@@ -38,10 +54,50 @@ class VlogProcessingTask(models.Model):
     vlog = models.OneToOneField(Vlog, on_delete=models.CASCADE, related_name='processing_task')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
     error_message = models.TextField(blank=True, null=True) 
+    # Whether the upload already had its moov atom up front, null for non MP4/MOV containers
+    was_faststart = models.BooleanField(blank=True, null=True)
+
+    # Bookkeeping of `vlogs.tasks.process_video_validation`: a run claims the job by setting the
+    # heartbeat, which its worker then refreshes until `finished_at` is set
+    attempts = models.PositiveSmallIntegerField(default=0)
+    queued_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Stage being run, and {stage: {started_at, finished_at, seconds}} of the last run
+    stage = models.CharField(max_length=20, blank=True, null=True)
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Media stages that failed with a transient error, the only ones a retry runs again
+    failed_stages = models.JSONField(default=list, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The sweeper looks for unfinished jobs with a stale heartbeat
+            models.Index(fields=['finished_at', 'heartbeat_at']),
+        ]
+
+
+class MediaDigest(models.Model):
+    """
+    Derivatives produced for an uploaded video, by the SHA-256 of its content, so that
+    the same content uploaded again reuses them instead of being processed again.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    thumbnails = models.JSONField(default=dict)
+    thumbnail = models.CharField(max_length=255)
+    playlist_key = models.CharField(max_length=255)
+    # Seconds spent producing the derivatives, and saved each time they are reused
+    processing_seconds = models.FloatField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    saved_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
 
 class Comment(models.Model):
     vlog = models.ForeignKey(Vlog, on_delete=models.CASCADE, related_name='vlog_comments')
@@ -50,6 +106,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['vlog', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user} on {self.vlog}'
 
@@ -61,6 +122,9 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('vlog', 'user')
+        indexes = [
+            models.Index(fields=['vlog', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f'Like by {self.user} on {self.video}'
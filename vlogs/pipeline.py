@@ -0,0 +1,344 @@
+import os
+import hashlib
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from celery.exceptions import SoftTimeLimitExceeded
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from trend.response_cache import bump_version
+from trend.s3_utils import S3
+from . import status
+from .media import (
+    HLS_CONTENT_TYPES, InvalidMedia, download, extract_frame, file_sha256, probe, probe_ffmpeg, remux_faststart,
+    render_thumbnails, transcode_hls,
+)
+from .models import MediaDigest, Vlog, VlogProcessingTask
+
+logger = logging.getLogger('vlogs')
+
+
+MAX_SIZE = 200 * 1024 * 1024  # 200 MB
+MAX_DURATION = 15  # seconds
+ALLOWED_EXTENSIONS = ['mp4', 'mov', 'avi']
+# Presigned PUT uploads without a Content-Type header are stored with one of these
+GENERIC_CONTENT_TYPES = ['binary/octet-stream', 'application/octet-stream']
+MEDIA_UPLOAD_WORKERS = 8
+HEARTBEAT_INTERVAL = 30  # seconds
+# A job whose heartbeat is older than this has lost its worker
+HEARTBEAT_TIMEOUT = HEARTBEAT_INTERVAL * 4
+
+
+def validate_video_size(file_size):
+    if file_size is None or file_size > MAX_SIZE:
+        raise ValidationError('File size exceeds the limit.')
+
+
+def validate_video_duration(duration):
+    if duration > MAX_DURATION:
+        raise ValidationError('Video duration exceeds the limit.')
+
+
+def validate_video_content_type(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if not content_type.startswith('video/') and content_type not in GENERIC_CONTENT_TYPES:
+        raise ValidationError(f"Invalid video content type: {content_type}")
+
+
+def validate_video_extension(file_key):
+    file_extension = os.path.splitext(file_key)[1][1:].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise ValidationError(f"Invalid video extension: {file_extension}. Allowed extensions are: {', '.join(ALLOWED_EXTENSIONS)}")
+
+
+def upload_stem(video):
+    return os.path.splitext(os.path.basename(video.vlog_key))[0]
+
+
+# Derivatives are versioned by the upload, so a replaced video never serves cached files of the
+# old one and a `MediaDigest` entry keeps pointing to the derivatives of its own content
+def thumbnail_key(video, size, fmt):
+    return f'media/thumbnails/{video.id}/{upload_stem(video)}/{size}.{"jpg" if fmt == "jpeg" else fmt}'
+
+
+def hls_prefix(video):
+    return f'media/hls/{video.id}/{upload_stem(video)}'
+
+
+def upload_files(files):
+    """Upload (key, bytes or local path, content type) triples concurrently."""
+    def upload(key, body, content_type):
+        if isinstance(body, str):
+            with open(body, 'rb') as file:
+                return S3().upload_file(key, file, content_type)
+        return S3().upload_file(key, body, content_type)
+
+    with ThreadPoolExecutor(max_workers=MEDIA_UPLOAD_WORKERS) as executor:
+        for future in [executor.submit(upload, *file) for file in files]:
+            future.result()
+
+
+class StagesFailed(Exception):
+    """Media stages of a validated vlog failed with transient errors, `stages` are worth running again."""
+
+    def __init__(self, stages, errors):
+        super().__init__(f"Stages {', '.join(stages)} failed: {'; '.join(errors)}")
+        self.stages = stages
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refresh the heartbeat of a vlog's processing job every HEARTBEAT_INTERVAL seconds while
+    the pipeline runs, including through long ffmpeg stages. Used as a context manager.
+    """
+
+    def __init__(self, video_id):
+        super().__init__(name=f'heartbeat-vlog-{video_id}', daemon=True)
+        self.video_id = video_id
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_INTERVAL):
+                try:
+                    VlogProcessingTask.objects.filter(vlog_id=self.video_id).update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Video {self.video_id}: heartbeat failed: {e}")
+        finally:
+            # The thread has its own DB connection
+            connection.close()
+
+
+class VlogPipeline:
+    """
+    Process one vlog in a single worker, stage by stage.
+
+    `probe` and `validate` only read the object's metadata and headers, a failure there rejects
+    the upload. The media stages then share one local copy of the upload, downloaded on first
+    use into a private work directory that is removed when the run ends, whatever happens.
+    A failing media stage is logged and the following ones still run. Once they all ran, the
+    stages that failed with a transient error (or did not finish before the soft time limit)
+    are raised as `StagesFailed`, for the task to retry only them; a media stage rejecting
+    the content is not retried. Every stage transition is published to `vlogs.status` for
+    the clients streaming the vlog's status.
+
+    The local copy is hashed while it downloads: when `dedup` finds the same content in the
+    `MediaDigest` index, the derived stages are skipped and their output reused, otherwise the
+    new derivatives are indexed at the end of the run.
+
+    The current stage and when each stage started and finished are recorded on the vlog's
+    `VlogProcessingTask`.
+    """
+    VALIDATION_STAGES = ['probe', 'validate']
+    MEDIA_STAGES = ['dedup', 'faststart', 'thumbnail', 'transcode']
+    # Stages whose output is indexed by content and reused
+    DERIVED_STAGES = ['thumbnail', 'transcode']
+
+    def __init__(self, video, completed_stages=()):
+        self.video = video
+        self.extension = os.path.splitext(video.vlog_key)[1]
+        self.head = None
+        self.info = None
+        self.work_dir = None
+        self.source = None
+        self.sha256 = None
+        # Digests of the uploaded content and of its faststart remux, which replaces it in S3
+        self.digests = []
+        self.reused = None
+        self.stage_timings = {}
+        # Including the stages an earlier run of the job completed, when only the failed ones are retried
+        self.completed_stages = list(completed_stages)
+        self.failed_stages = []
+
+    @classmethod
+    def retry_stages(cls, failed_stages):
+        """The stages a retry runs for `failed_stages`, with `dedup` again to index what they produce."""
+        stages = set(failed_stages)
+        if stages & set(cls.DERIVED_STAGES):
+            stages.add('dedup')
+        return [stage for stage in cls.MEDIA_STAGES if stage in stages]
+
+    def run(self, stages=None):
+        stages = stages or self.VALIDATION_STAGES + self.MEDIA_STAGES
+        errors = []
+        with tempfile.TemporaryDirectory(prefix=f'vlog_{self.video.pk}_') as work_dir:
+            self.work_dir = work_dir
+            try:
+                for index, stage in enumerate(stages):
+                    if self.reused is not None and stage in self.DERIVED_STAGES:
+                        continue
+                    if stage in self.VALIDATION_STAGES:
+                        self.run_stage(stage)
+                        continue
+                    try:
+                        self.run_stage(stage)
+                    except SoftTimeLimitExceeded as e:
+                        # The vlog is validated, only the media stages left are run again
+                        remaining = [stage for stage in stages[index:] if stage in self.MEDIA_STAGES]
+                        raise StagesFailed(self.failed_stages + remaining, errors + ['soft time limit exceeded']) from e
+                    except (ValidationError, InvalidMedia) as e:
+                        # Running the stage again on the same content would fail the same way
+                        logger.error(f"Video {self.video.pk}: stage {stage} failed: {e}", exc_info=True)
+                    except Exception as e:
+                        logger.error(f"Video {self.video.pk}: stage {stage} failed: {e}", exc_info=True)
+                        self.failed_stages.append(stage)
+                        errors.append(f'{stage}: {e}')
+                if self.failed_stages:
+                    raise StagesFailed(self.failed_stages, errors)
+                if self.digests and self.reused is None:
+                    self.index()
+                self.publish(stages[-1], 100, done=True)
+            finally:
+                self.work_dir = self.source = None
+
+    def run_stage(self, stage):
+        logger.info(f"Video {self.video.pk}: running stage {stage}")
+        self.publish(stage)
+        started = timezone.now()
+        self.stage_timings[stage] = {'started_at': started.isoformat()}
+        self.save_progress(stage)
+        try:
+            getattr(self, stage)()
+        finally:
+            finished = timezone.now()
+            self.stage_timings[stage].update(
+                finished_at=finished.isoformat(), seconds=(finished - started).total_seconds(),
+            )
+            self.save_progress(stage)
+        self.completed_stages.append(stage)
+
+    def save_progress(self, stage):
+        VlogProcessingTask.objects.filter(vlog_id=self.video.pk).update(
+            stage=stage, stage_timings=self.stage_timings, heartbeat_at=timezone.now(),
+        )
+
+    def publish(self, stage, stage_progress=0, done=False):
+        status.publish(self.video.pk, VlogProcessingTask.COMPLETED if done else status.PROCESSING,
+                       stage, stage_progress, done=done)
+
+    def local_source(self):
+        """Path of the local copy of the upload, downloaded on first use."""
+        if self.source is None:
+            path = os.path.join(self.work_dir, f'source{self.extension}')
+            digest = hashlib.sha256()
+            self.source = download(S3().get_file(self.video.vlog_key), path, digest)
+            self.sha256 = digest.hexdigest()
+        return self.source
+
+    def probe(self):
+        # Validate file size and content type from the object metadata before transferring any bytes
+        validate_video_extension(self.video.vlog_key)
+        self.head = S3().head_file(self.video.vlog_key)
+        validate_video_size(self.head['ContentLength'])
+        validate_video_content_type(self.head.get('ContentType'))
+        # Read the container metadata with range requests
+        self.info = probe(S3().get_file(self.video.vlog_key), self.extension[1:])
+        logger.info(f"Video {self.video.pk} probed: {self.info}")
+
+    def validate(self):
+        duration_seconds = self.info['duration']
+        validate_video_duration(duration_seconds)
+        self.video.duration = timedelta(seconds=duration_seconds)
+        self.video.processing_status = 'completed'
+        self.video.save(update_fields=['duration', 'processing_status', 'updated_at'])
+        VlogProcessingTask.objects.filter(vlog=self.video).update(
+            status=VlogProcessingTask.COMPLETED, error_message=None, was_faststart=self.info.get('faststart'),
+        )
+        logger.info(f"Video {self.video.pk} validated, duration: {duration_seconds} seconds")
+
+    def dedup(self):
+        """Reuse the derivatives of an earlier upload of the same content."""
+        self.local_source()
+        self.digests.append(self.sha256)
+        Vlog.objects.filter(pk=self.video.pk).update(content_sha256=self.sha256)
+        entry = MediaDigest.objects.filter(sha256=self.sha256).first()
+        if entry is None:
+            return
+        Vlog.objects.filter(pk=self.video.pk).update(
+            thumbnails=entry.thumbnails, thumbnail=entry.thumbnail, playlist_key=entry.playlist_key,
+        )
+        bump_version('vlogs')
+        MediaDigest.objects.filter(pk=entry.pk).update(
+            hits=F('hits') + 1, saved_seconds=F('saved_seconds') + entry.processing_seconds,
+        )
+        self.reused = entry
+        logger.info(f"Video {self.video.pk} reuses the derivatives of {entry.sha256}, "
+                    f"saving {entry.processing_seconds:.1f} seconds of processing")
+
+    def index(self):
+        """Record the derivatives produced by this run under the digests of the content."""
+        if not all(stage in self.completed_stages for stage in self.DERIVED_STAGES):
+            # A derived stage failed or did not run, a later upload will produce them
+            return
+        video = Vlog.objects.filter(pk=self.video.pk).values('thumbnails', 'thumbnail', 'playlist_key').first()
+        if video is None:
+            return
+        for sha256 in self.digests:
+            MediaDigest.objects.get_or_create(sha256=sha256, defaults={
+                **video,
+                'processing_seconds': sum(self.stage_timings[stage]['seconds'] for stage in self.DERIVED_STAGES),
+            })
+
+    def faststart(self):
+        """Move the moov atom of MP4/MOV uploads to the front and replace the served object."""
+        if self.info is not None:
+            was_faststart = self.info.get('faststart')
+        else:
+            was_faststart = VlogProcessingTask.objects.filter(vlog=self.video).values_list('was_faststart', flat=True).first()
+        if was_faststart is not False:
+            return
+        self.source = remux_faststart(self.local_source(), os.path.join(self.work_dir, f'faststart{self.extension}'))
+        if self.digests:
+            # Submitting the replaced object again (e.g. through VlogUpdateView) is then a hit too
+            self.digests.append(file_sha256(self.source))
+        content_type = (self.head or S3().head_file(self.video.vlog_key)).get('ContentType')
+        with open(self.source, 'rb') as file:
+            S3().upload_file(self.video.vlog_key, file, content_type, cache_control=None)
+        logger.info(f"Video {self.video.pk} replaced with its faststart remux")
+
+    def thumbnail(self):
+        frame = extract_frame(self.local_source())
+        keys = {}
+        files = []
+        for (size, fmt), (body, content_type) in render_thumbnails(frame).items():
+            key = thumbnail_key(self.video, size, fmt)
+            keys.setdefault(size, {})[fmt] = key
+            files.append((key, body, content_type))
+        upload_files(files)
+        Vlog.objects.filter(pk=self.video.pk).update(
+            thumbnails=keys,
+            # Storage-relative name (MediaStorage adds the media/ prefix)
+            thumbnail=keys['detail']['jpeg'].removeprefix('media/'),
+        )
+        bump_version('vlogs')
+        logger.info(f"Thumbnails uploaded for video {self.video.pk}: {keys}")
+
+    def transcode(self):
+        source = self.local_source()
+        info = self.info if self.info and self.info.get('width') else probe_ffmpeg(source)
+        output_dir = os.path.join(self.work_dir, 'hls')
+        os.makedirs(output_dir, exist_ok=True)
+        master = transcode_hls(source, output_dir, info['width'], info['height'],
+                               on_progress=lambda done, total: self.publish('transcode', 90 * done // total))
+
+        prefix = hls_prefix(self.video)
+        upload_files([
+            (f'{prefix}/{name}', os.path.join(output_dir, name), HLS_CONTENT_TYPES[os.path.splitext(name)[1]])
+            for name in os.listdir(output_dir)
+        ])
+        # Published only once every segment is uploaded
+        Vlog.objects.filter(pk=self.video.pk).update(playlist_key=f'{prefix}/{master}')
+        bump_version('vlogs')
+        logger.info(f"HLS playlist uploaded for video {self.video.pk}")
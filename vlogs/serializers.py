@@ -1,10 +1,35 @@
-from urllib.parse import urljoin
-from django.conf import settings
+import os
 from rest_framework import serializers
 
 from profiles.models import Profile
-from profiles.serializers import ProfileSerializer
-from .models import Vlog, Comment
+from profiles.serializers import ProfileSerializer, UserProfileListSerializer
+from trend import like_buffer
+from trend.media_urls import media_url, media_urls, signing_enabled
+from . import hls
+from .models import Vlog, Comment, Like
+
+
+class VlogListSerializer(serializers.ListSerializer):
+    """
+    Resolve which vlogs of the page the viewer liked with a single IN query and
+    expose them to the child serializer as `liked_vlog_ids` in the context.
+    The media URLs of the page are resolved in one batch as well.
+    """
+
+    def to_representation(self, data):
+        vlogs = list(data.all() if hasattr(data, 'all') else data)
+        media_urls(key for vlog in vlogs for key in VlogSerializer.media_keys(vlog))
+        request = self.context.get('request')
+        if request and hasattr(request, 'user') and request.user.is_authenticated:
+            liked_vlog_ids = self.context.setdefault('liked_vlog_ids', set())
+            liked_vlog_ids.update(
+                Like.objects.filter(user=request.user, vlog_id__in=[vlog.id for vlog in vlogs])
+                .values_list('vlog_id', flat=True)
+            )
+            like_buffer.apply_to_instances(like_buffer.VLOG, vlogs, request.user, liked_vlog_ids)
+        else:
+            like_buffer.apply_to_instances(like_buffer.VLOG, vlogs)
+        return super().to_representation(vlogs)
 
 
 class VlogSerializer(serializers.ModelSerializer):
@@ -12,6 +37,9 @@ class VlogSerializer(serializers.ModelSerializer):
     profile_id = serializers.ReadOnlyField(source='user.profile.id')
     username = serializers.CharField(source='user.username', read_only=True)
     vlog_url = serializers.SerializerMethodField()
+    playlist_url = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
     # avatar = serializers.ImageField(source='user.avatar', read_only=True)
     like_count = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
@@ -20,25 +48,60 @@ class VlogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Vlog
-        fields = ['id', 'user_id', 'profile_id', 'username',  'title', 'description', 'vlog_url', 'duration', 'thumbnail', 'processing_status', 'like_count', 'comment_count', 'liked', 'created_at', 'updated_at']
+        fields = ['id', 'user_id', 'profile_id', 'username',  'title', 'description', 'vlog_url', 'playlist_url', 'duration', 'thumbnail', 'thumbnails', 'processing_status', 'like_count', 'comment_count', 'liked', 'created_at', 'updated_at']
+        list_serializer_class = VlogListSerializer
 
     def get_like_count(self, obj):
-        return obj.likes_count()
+        return obj.likes_count
 
     def get_comment_count(self, obj):
-        return obj.comments_count()
+        return obj.comments_count
 
     def get_liked(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
-            return obj.vlog_likes.filter(user=request.user).exists()
+            liked_vlog_ids = self.context.get('liked_vlog_ids')
+            if liked_vlog_ids is not None:
+                return obj.id in liked_vlog_ids
+            liked = obj.vlog_likes.filter(user=request.user).exists()
+            if like_buffer.is_enabled():
+                liked = like_buffer.pending_states(like_buffer.VLOG, request.user.pk, [obj.id]).get(obj.id, liked)
+            return liked
         return False
 
+    @staticmethod
+    def thumbnail_key(obj):
+        # Storage-relative name, MediaStorage stores it under media/
+        return f'media/{obj.thumbnail.name}' if obj.thumbnail else None
+
+    @classmethod
+    def media_keys(cls, obj):
+        keys = [obj.vlog_key, cls.thumbnail_key(obj)]
+        if not signing_enabled():
+            keys.append(obj.playlist_key)
+        keys.extend(key for formats in (obj.thumbnails or {}).values() for key in formats.values())
+        return keys
+
     def get_vlog_url(self, obj):
         """Generate the full URL for the image"""
-        if obj.vlog_key:
-            return urljoin(settings.MEDIA_URL, obj.vlog_key)
-        return None
+        return media_url(obj.vlog_key)
+
+    def get_playlist_url(self, obj):
+        """HLS master playlist, null until transcoding finished (clients fall back to vlog_url)"""
+        if obj.playlist_key and signing_enabled():
+            # The private bucket only serves presigned URLs, the URIs inside the playlists are signed by `vlogs.hls`
+            return hls.playlist_url(obj.id, os.path.basename(obj.playlist_key))
+        return media_url(obj.playlist_key)
+
+    def get_thumbnail(self, obj):
+        return media_url(self.thumbnail_key(obj))
+
+    def get_thumbnails(self, obj):
+        """{size: {format: url}} of the card, detail and blur thumbnails"""
+        return {
+            size: {fmt: media_url(key) for fmt, key in formats.items()}
+            for size, formats in (obj.thumbnails or {}).items()
+        }
 
 
 class VlogCreateSerializer(serializers.ModelSerializer):
@@ -61,3 +124,4 @@ class VlogLikersSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ('profile',)
+        list_serializer_class = UserProfileListSerializer
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from trend.response_cache import bump_version
+from .models import Vlog, Comment, Like
+
+
+@receiver(post_save, sender=Vlog)
+@receiver(post_delete, sender=Vlog)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_vlog_list_version(sender, instance, **kwargs):
+    bump_version('vlogs')
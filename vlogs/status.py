@@ -0,0 +1,118 @@
+"""
+Live processing status of vlogs.
+
+The media pipeline calls `publish()` at every stage transition: the latest status is kept
+in `vlog_status_{id}` and pushed on the `vlog_status_{id}` pub/sub channel. `stream()` turns
+them into Server-Sent Events for `VlogProcessingStatusStreamView`, so a waiting client holds
+one idle connection instead of polling the status view.
+"""
+import json
+import time
+import logging
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+from .models import VlogProcessingTask
+
+logger = logging.getLogger('vlogs')
+
+
+STATUS_TIMEOUT = 60 * 60 * 24  # 1 day
+KEEPALIVE_INTERVAL = 15  # seconds, keeps proxies from closing an idle stream
+MAX_STREAM_DURATION = 60 * 20  # seconds, clients reconnect if processing takes longer
+
+# Streamed while the stages run, VlogProcessingTask only stores the final statuses
+PROCESSING = 'processing'
+
+# stage: (progress when it starts, progress when it ends), in percent of the whole pipeline
+STAGE_PROGRESS = {
+    'probe': (0, 10),
+    'validate': (10, 15),
+    'dedup': (15, 25),
+    'faststart': (25, 30),
+    'thumbnail': (30, 40),
+    'transcode': (40, 100),
+}
+
+
+def status_key(vlog_id):
+    return f'vlog_status_{vlog_id}'
+
+
+def publish(vlog_id, status, stage=None, stage_progress=0, done=False, error=None):
+    """
+    Record and broadcast the status of a vlog. `status` is the VlogProcessingTask status,
+    `done` tells that no further stage will run.
+    """
+    start, end = STAGE_PROGRESS.get(stage, (0, 0))
+    if done:
+        progress = 100
+    else:
+        progress = int(start + (end - start) * stage_progress / 100)
+    payload = json.dumps({
+        'status': status,
+        'stage': stage,
+        'stage_progress': int(stage_progress),
+        'progress': progress,
+        'done': done,
+        'error_message': error,
+    })
+    # Status reporting must never fail the processing itself
+    try:
+        pipe = get_redis_connection('default').pipeline()
+        pipe.set(status_key(vlog_id), payload, ex=STATUS_TIMEOUT)
+        pipe.publish(status_key(vlog_id), payload)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not publish the status of video {vlog_id}: {e}")
+
+
+def _event(payload):
+    return f'event: status\ndata: {payload}\n\n'
+
+
+@sync_to_async
+def _status_from_db(vlog_id):
+    task = VlogProcessingTask.objects.filter(vlog_id=vlog_id).values('status', 'error_message').first()
+    if task is None:
+        return None
+    final = task['status'] != VlogProcessingTask.PENDING
+    return json.dumps({
+        'status': task['status'],
+        'stage': None,
+        'stage_progress': 100 if final else 0,
+        'progress': 100 if final else 0,
+        'done': final,
+        'error_message': task['error_message'],
+    })
+
+
+async def stream(vlog_id):
+    """Yield SSE frames with the vlog's status until processing is done or failed."""
+    client = aioredis.from_url(settings.CACHES['default']['LOCATION'])
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the current status so no transition is missed in between
+        await pubsub.subscribe(status_key(vlog_id))
+        current = await client.get(status_key(vlog_id))
+        payload = current.decode() if current else await _status_from_db(vlog_id)
+        if payload is not None:
+            yield _event(payload)
+            if json.loads(payload)['done']:
+                return
+
+        deadline = time.monotonic() + MAX_STREAM_DURATION
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            payload = message['data'].decode()
+            yield _event(payload)
+            if json.loads(payload)['done']:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
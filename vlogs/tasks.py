@@ -1,145 +1,218 @@
-import os
-import tempfile
 import logging
 from datetime import timedelta
-from urllib.parse import urljoin
 from celery import shared_task
-from django.conf import settings
-from moviepy.editor import VideoFileClip
-from django.core.files import File
-from django.core.files.storage import default_storage
 from django.core.exceptions import ValidationError
-from PIL import Image
-import requests
-from trend.s3_utils import S3
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from trend import like_buffer, trending
+from trend.response_cache import bump_version
+from uploads.tasks import delete_s3_file
+from .media import InvalidMedia
 
 logger = logging.getLogger('vlogs')
 
 
-MAX_SIZE = 200 * 1024 * 1024  # 200 MB
-MAX_DURATION = 15  # seconds
-ALLOWED_EXTENSIONS = ['mp4', 'mov', 'avi']
-
-
-def validate_video_size(file_path):
-    file_size = os.path.getsize(file_path)
-    if file_size > MAX_SIZE:
-        raise ValidationError('File size exceeds the limit.')
-
-
-def validate_video_duration(duration):
-    if duration > MAX_DURATION:
-        raise ValidationError('Video duration exceeds the limit.')
+RECONCILE_BATCH_SIZE = 1000
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 30  # seconds, doubled on every attempt
+RETRY_BACKOFF_MAX = 60 * 10
+QUEUE_TIMEOUT = 60 * 60  # seconds an enqueued job may wait for a worker before it is enqueued again
+SWEEP_BATCH_SIZE = 100
+# Errors about the upload itself, retrying would fail the same way. Media stages do not raise
+# them, so they only come from the validation stages and reject the upload. Storage and
+# ffmpeg failures are transient and retried.
+PERMANENT_ERRORS = (ValidationError, InvalidMedia)
+
+
+@shared_task(bind=True)
+def process_video_validation(self, video_id):
+    """
+    Run the whole media pipeline of an uploaded vlog, see `VlogPipeline`.
+
+    Idempotent: the run first claims the job, which fails if the job is finished or another
+    worker still refreshes its heartbeat, so duplicate or swept deliveries are harmless.
+    Transient errors are retried with exponential backoff, up to MAX_ATTEMPTS runs. Once the
+    vlog is validated, a retry only runs the media stages that failed (`failed_stages`), and
+    running out of attempts keeps the vlog published without their output.
+    """
+    from .models import Vlog, VlogProcessingTask
+    from .pipeline import HEARTBEAT_TIMEOUT, Heartbeat, StagesFailed, VlogPipeline
+    video = Vlog.objects.filter(id=video_id).first()
+    if video is None:
+        logger.warning(f"Video {video_id} no longer exists, skipping processing")
+        return
+    VlogProcessingTask.objects.get_or_create(vlog=video)
+    now = timezone.now()
+    claimed = VlogProcessingTask.objects.filter(vlog=video, finished_at__isnull=True).filter(
+        Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=now - timedelta(seconds=HEARTBEAT_TIMEOUT))
+    ).update(attempts=F('attempts') + 1, started_at=now, heartbeat_at=now, stage=None)
+    if not claimed:
+        logger.info(f"Video {video_id} is already processed or being processed, skipping")
+        return
+    job = VlogProcessingTask.objects.filter(vlog=video).values('attempts', 'status', 'failed_stages').get()
+    attempts = job['attempts']
+    if job['status'] == VlogProcessingTask.COMPLETED and job['failed_stages']:
+        stages = VlogPipeline.retry_stages(job['failed_stages'])
+        pipeline = VlogPipeline(video, completed_stages=[stage for stage in VlogPipeline.MEDIA_STAGES if stage not in stages])
+    else:
+        stages = None
+        pipeline = VlogPipeline(video)
+    logger.info(f"Processing video {video_id}, attempt {attempts}, stages {stages or 'all'}")
+    try:
+        with Heartbeat(video_id):
+            pipeline.run(stages)
+    except PERMANENT_ERRORS as e:
+        fail_processing(video, e, delete_upload=True)
+    except Exception as e:
+        failed_stages = e.stages if isinstance(e, StagesFailed) else []
+        if attempts >= MAX_ATTEMPTS:
+            if isinstance(e, StagesFailed):
+                finish_without_derivatives(video, e)
+            else:
+                fail_processing(video, e)
+            return
+        countdown = min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+        # Release the claim so the retry, or the sweeper if it gets lost, can take the job again
+        VlogProcessingTask.objects.filter(vlog=video).update(
+            heartbeat_at=None, queued_at=now + timedelta(seconds=countdown), error_message=str(e),
+            failed_stages=failed_stages,
+        )
+        logger.warning(f"Error processing video {video_id}, retrying in {countdown} seconds: {e}")
+        raise self.retry(exc=e, countdown=countdown, max_retries=None)
+    else:
+        VlogProcessingTask.objects.filter(vlog=video).update(
+            finished_at=timezone.now(), heartbeat_at=None, stage=None, failed_stages=[],
+        )
+
+
+def finish_without_derivatives(video, error):
+    """Give up on the failed media stages of a validated vlog, which stays published."""
+    from . import status
+    from .models import VlogProcessingTask
+    VlogProcessingTask.objects.filter(vlog=video).update(
+        error_message=str(error), finished_at=timezone.now(), heartbeat_at=None, stage=None,
+    )
+    status.publish(video.id, VlogProcessingTask.COMPLETED, done=True)
+    logger.error(f"Giving up on the media stages of video {video.id}: {error}")
+
+
+def fail_processing(video, error, delete_upload=False):
+    from . import status
+    from .models import VlogProcessingTask
+    VlogProcessingTask.objects.filter(vlog=video).update(
+        status=VlogProcessingTask.FAILED, error_message=str(error), finished_at=timezone.now(), heartbeat_at=None,
+    )
+    video.processing_status = 'failed'
+    video.save(update_fields=['processing_status', 'updated_at'])
+    status.publish(video.id, VlogProcessingTask.FAILED, done=True, error=str(error))
+    if delete_upload:
+        # Clean up the invalid video from S3
+        delete_s3_file.delay(video.vlog_key)
+    logger.error(f"Error processing video {video.id}: {error}", exc_info=error)
 
 
-def validate_video_extension(file_key):
-    file_extension = os.path.splitext(file_key)[1][1:].lower()
-    if file_extension not in ALLOWED_EXTENSIONS:
-        raise ValidationError(f"Invalid video extension: {file_extension}. Allowed extensions are: {', '.join(ALLOWED_EXTENSIONS)}")
+@shared_task
+def sweep_stuck_vlog_tasks(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Find the unfinished processing jobs whose worker died (stale heartbeat) or whose message
+    was lost (never claimed), and enqueue them again, or give up after MAX_ATTEMPTS runs.
+    """
+    from .models import Vlog, VlogProcessingTask
+    from .pipeline import HEARTBEAT_TIMEOUT
+    from . import status
+    now = timezone.now()
+    stuck = VlogProcessingTask.objects.filter(finished_at__isnull=True).filter(
+        Q(heartbeat_at__lt=now - timedelta(seconds=HEARTBEAT_TIMEOUT))
+        | Q(heartbeat_at__isnull=True, queued_at__lt=now - timedelta(seconds=QUEUE_TIMEOUT))
+    )
+    last_id = 0
+    requeued = failed = 0
+    while True:
+        batch = list(stuck.filter(pk__gt=last_id).order_by('pk').values('pk', 'vlog_id', 'attempts', 'status')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]['pk']
+        retry = [job for job in batch if job['attempts'] < MAX_ATTEMPTS]
+        exhausted = [job for job in batch if job['attempts'] >= MAX_ATTEMPTS]
+
+        # Every UPDATE repeats the staleness condition, so a job that just sent a heartbeat is left alone
+        stuck.filter(pk__in=[job['pk'] for job in retry]).update(heartbeat_at=None, queued_at=now)
+        for job in retry:
+            status.publish(job['vlog_id'], VlogProcessingTask.PENDING)
+            process_video_validation.delay(job['vlog_id'])
+        requeued += len(retry)
+
+        # Validated vlogs stay published without the derivatives, the others are failed
+        given_up = [job['pk'] for job in exhausted if job['status'] == VlogProcessingTask.COMPLETED]
+        stuck.filter(pk__in=given_up).update(finished_at=now, heartbeat_at=None, stage=None)
+        failed_ids = [job['vlog_id'] for job in exhausted if job['status'] != VlogProcessingTask.COMPLETED]
+        stuck.filter(vlog_id__in=failed_ids).update(
+            status=VlogProcessingTask.FAILED, finished_at=now, heartbeat_at=None,
+            error_message=f'Processing did not finish after {MAX_ATTEMPTS} attempts',
+        )
+        if Vlog.objects.filter(id__in=failed_ids).update(processing_status='failed'):
+            bump_version('vlogs')
+        for vlog_id in failed_ids:
+            status.publish(vlog_id, VlogProcessingTask.FAILED, done=True, error='Processing did not finish')
+        failed += len(failed_ids)
+    if requeued or failed:
+        logger.warning(f"Swept stuck vlog processing jobs: {requeued} enqueued again, {failed} failed")
+    return requeued, failed
+
+
+def real_counters():
+    """Counter expressions computed from the like and comment tables."""
+    from .models import Like, Comment
+    likes = Like.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(c=Count('*')).values('c')
+    comments = Comment.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(c=Count('*')).values('c')
+    return {
+        'likes_count': Coalesce(Subquery(likes), 0),
+        'comments_count': Coalesce(Subquery(comments), 0),
+    }
 
 
-def generate_thumbnail(file_path, video_id):
-    thumbnail_path = file_path.replace('.mp4', f'_{video_id}_thumbnail.jpg')
-    logger.info(f"Generating thumbnail for video {video_id} at {thumbnail_path}")
-    with VideoFileClip(file_path) as video_clip:
-        frame = video_clip.get_frame(1)  # Extract frame at 1 second
-        image = Image.fromarray(frame)
-        image.save(thumbnail_path, format='JPEG')
-    return thumbnail_path
+@shared_task
+def reconcile_vlog_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Walk the vlogs table in primary key batches and rewrite the like/comment
+    counters of every vlog that drifted from the real tables.
+    """
+    from .models import Vlog
+    last_id = 0
+    fixed = 0
+    while True:
+        batch = list(Vlog.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        counters = real_counters()
+        stale_ids = list(
+            Vlog.objects.filter(pk__in=batch)
+            .annotate(real_likes=counters['likes_count'], real_comments=counters['comments_count'])
+            .filter(~Q(likes_count=F('real_likes')) | ~Q(comments_count=F('real_comments')))
+            .values_list('pk', flat=True)
+        )
+        if stale_ids:
+            # Recount inside the UPDATE itself so writes made since the check are not lost
+            fixed += Vlog.objects.filter(pk__in=stale_ids).update(**real_counters())
+    logger.info(f"Reconciled counters for {fixed} vlogs")
+    return fixed
 
 
 @shared_task
-def process_video_validation(video_id):
-    from .models import Vlog, VlogProcessingTask
-    try:
-        video = Vlog.objects.get(id=video_id)
-        task = video.processing_task
-        logger.info(f"Processing video {video_id}")
-
-        vlog_url = urljoin(settings.MEDIA_URL, video.vlog_key)
-        # Download video from URL
-        response = requests.get(vlog_url, stream=True)
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to download video from {video.video_url}")
-
-        # Save the downloaded video to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:  # filter out keep-alive new chunks
-                    temp_file.write(chunk)
-            temp_file.close()
-            temp_video_path = temp_file.name
-
-        # Validate file size
-        validate_video_size(temp_video_path)
-        logger.info(f"Video file size validated.")
-
-        # Validate video extension
-        validate_video_extension(video.vlog_key)
-        logger.info(f"Video file extention validated.")
-
-        # Calculate duration and validate it
-        with VideoFileClip(temp_video_path) as video_clip:
-            duration_seconds = video_clip.duration
-            validate_video_duration(duration_seconds)
-            # Convert seconds to timedelta
-            duration_timedelta = timedelta(seconds=duration_seconds)
-            video.duration = duration_timedelta
-            video.save()
-            logger.info(f"Video duration: {duration_seconds} seconds")
-
-        # Process thumbnail in a separate task
-        process_thumbnail.delay(video_id, temp_video_path)
-
-        # Update the task status to completed
-        task.status = VlogProcessingTask.COMPLETED
-        task.error_message = None
-        task.save()
-        video.processing_status = 'completed'
-        video.save()
+def flush_vlog_likes():
+    """Apply the likes buffered in Redis (`LIKE_WRITE_BEHIND`) to the DB."""
+    from .models import Vlog, Like
 
-    except Exception as e:
-        task = VlogProcessingTask.objects.get(vlog_id=video_id)
-        task.status = VlogProcessingTask.FAILED
-        task.error_message = str(e)
-        task.save()
-        video.processing_status = 'failed'
-        video.save()
+    flushed = like_buffer.flush(like_buffer.VLOG, Vlog, Like, 'vlog', 'vlogs')
+    if flushed:
+        logger.info(f"Flushed {flushed} buffered vlog likes")
+    return flushed
 
-        # Clean up the invalid video from S3
-        S3().delete_file(video.vlog_key)
-        logger.error(f"Error processing video {video_id}: {e}", exc_info=True)
 
 @shared_task
-def process_thumbnail(video_id, temp_video_path):
-    from .models import Vlog
-    try:
-        video = Vlog.objects.get(id=video_id)
-        logger.info(f"Processing thumbnail for video {video_id} using temp video path {temp_video_path}")
-
-        thumbnail_path = generate_thumbnail(temp_video_path, video_id)
-        logger.info(f"Thumbnail generated at {thumbnail_path}")
-
-        # Upload thumbnail to S3
-        with open(thumbnail_path, 'rb') as thumbnail_file:
-            video.thumbnail.save(f'{video_id}_thumbnail.jpg', File(thumbnail_file))
-            logger.info(f"Thumbnail uploaded and saved for video {video_id}")
-        # Clean up the thumbnail file
-        if os.path.exists(thumbnail_path):
-            os.remove(thumbnail_path)
-            logger.info(f"Thumbnail file removed: {thumbnail_path}")
-        else:
-            logger.warning(f"Thumbnail file not found during cleanup: {thumbnail_path}")
-    
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
-            logger.info(f"Temporary video file removed: {temp_video_path}")
-        else:
-            logger.warning(f"Temporary video file not found during cleanup: {temp_video_path}")
-
-        # Save the updated video instance
-        video.save()
-        logger.info(f"Video {video_id} saved successfully")
-    except Exception as e:
-        logger.error(f"Error generating thumbnail for video {video_id}: {e}", exc_info=True)
+def recompute_trending_vlogs():
+    ranked = trending.recompute(trending.VLOG)
+    logger.info(f"Recomputed trending vlogs, {ranked} ranked")
+    return ranked
@@ -1,3 +1,163 @@
+import struct
+from datetime import timedelta
+from unittest import mock
+import requests
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from users.models import CustomUser
+from .media import InvalidMedia, ProbeError, probe_iso
+from .models import Vlog, VlogProcessingTask
+from .pipeline import StagesFailed, VlogPipeline
+from .tasks import MAX_ATTEMPTS, process_video_validation, sweep_stuck_vlog_tasks
 
-# Create your tests here.
+
+def range_response(body, status_code=206):
+    """A response to a Range request over `body`, which fits in the first read."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers['Content-Range'] = f'bytes 0-{len(body) - 1}/{len(body)}'
+    return response
+
+
+def box(box_type, payload=b''):
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+class ProbeIsoTests(TestCase):
+    def test_storage_errors_are_http_errors(self):
+        with mock.patch('requests.get', return_value=range_response(b'', status_code=503)):
+            with self.assertRaises(requests.HTTPError):
+                probe_iso('https://storage/upload.mp4')
+
+    def test_missing_moov_is_invalid_media(self):
+        body = box(b'ftyp', b'isom') + box(b'mdat', b'\0' * 64)
+        with mock.patch('requests.get', return_value=range_response(body)):
+            with self.assertRaises(InvalidMedia):
+                probe_iso('https://storage/upload.mp4')
+
+    def test_corrupt_box_is_invalid_media(self):
+        body = box(b'ftyp', b'isom') + struct.pack('>I', 4) + b'free' + b'\0' * 64
+        with mock.patch('requests.get', return_value=range_response(body)):
+            with self.assertRaises(InvalidMedia):
+                probe_iso('https://storage/upload.mp4')
+
+
+class VlogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('author', 'author@example.com', 'password')
+
+    def create_vlog(self, **job):
+        vlog = Vlog.objects.create(user=self.user, vlog_key='media/vlogs/upload.mp4', title='vlog')
+        VlogProcessingTask.objects.create(vlog=vlog, **job)
+        return vlog
+
+
+class VlogPipelineTests(VlogTestCase):
+    def run_stages(self, stages, **errors):
+        """Run `stages` with every stage mocked, raising `errors[stage]` if given."""
+        mocks = {stage: mock.Mock(side_effect=errors.get(stage))
+                 for stage in VlogPipeline.VALIDATION_STAGES + VlogPipeline.MEDIA_STAGES}
+        with mock.patch.multiple(VlogPipeline, **mocks):
+            VlogPipeline(self.create_vlog()).run(stages)
+        return mocks
+
+    def test_transient_media_errors_are_retried(self):
+        with self.assertRaises(StagesFailed) as raised:
+            self.run_stages(VlogPipeline.MEDIA_STAGES, thumbnail=ProbeError('ffmpeg crashed'))
+        self.assertEqual(raised.exception.stages, ['thumbnail'])
+
+    def test_failed_media_stage_does_not_stop_the_next_ones(self):
+        mocks = {stage: mock.Mock() for stage in VlogPipeline.MEDIA_STAGES}
+        mocks['faststart'].side_effect = requests.ConnectionError('storage unreachable')
+        with mock.patch.multiple(VlogPipeline, **mocks), self.assertRaises(StagesFailed) as raised:
+            VlogPipeline(self.create_vlog()).run(VlogPipeline.MEDIA_STAGES)
+        self.assertEqual(raised.exception.stages, ['faststart'])
+        mocks['thumbnail'].assert_called_once()
+        mocks['transcode'].assert_called_once()
+
+    def test_invalid_media_is_not_retried(self):
+        mocks = self.run_stages(VlogPipeline.MEDIA_STAGES, transcode=InvalidMedia('No moov atom found'))
+        mocks['transcode'].assert_called_once()
+
+    def test_soft_time_limit_retries_the_remaining_stages(self):
+        with self.assertRaises(StagesFailed) as raised:
+            self.run_stages(VlogPipeline.MEDIA_STAGES, faststart=SoftTimeLimitExceeded())
+        self.assertEqual(raised.exception.stages, ['faststart', 'thumbnail', 'transcode'])
+
+    def test_validation_errors_propagate(self):
+        with self.assertRaises(InvalidMedia):
+            self.run_stages(None, probe=InvalidMedia('Corrupt box at offset 0'))
+
+    def test_retry_stages_run_dedup_again_for_derived_stages(self):
+        self.assertEqual(VlogPipeline.retry_stages(['transcode']), ['dedup', 'transcode'])
+        self.assertEqual(VlogPipeline.retry_stages(['faststart']), ['faststart'])
+
+
+@mock.patch('vlogs.tasks.delete_s3_file')
+class ProcessVideoValidationTests(VlogTestCase):
+    def process(self, probe_error):
+        vlog = self.create_vlog()
+        with mock.patch.object(VlogPipeline, 'probe', side_effect=probe_error):
+            process_video_validation(vlog.pk)
+        vlog.refresh_from_db()
+        return vlog, VlogProcessingTask.objects.get(vlog=vlog)
+
+    def test_invalid_upload_is_rejected(self, delete_s3_file):
+        vlog, job = self.process(InvalidMedia('No moov atom found, not a valid MP4/MOV file'))
+        self.assertEqual((vlog.processing_status, job.status), ('failed', VlogProcessingTask.FAILED))
+        delete_s3_file.delay.assert_called_once_with(vlog.vlog_key)
+
+    def test_storage_error_is_retried(self, delete_s3_file):
+        error = requests.HTTPError('503 Server Error')
+        with mock.patch.object(process_video_validation, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                self.process(error)
+        retry.assert_called_once()
+        job = VlogProcessingTask.objects.get()
+        self.assertEqual((job.status, job.attempts, job.heartbeat_at), (VlogProcessingTask.PENDING, 1, None))
+        self.assertEqual(Vlog.objects.get().processing_status, 'pending')
+        delete_s3_file.delay.assert_not_called()
+
+
+@mock.patch('vlogs.tasks.process_video_validation.delay')
+class SweepStuckVlogTasksTests(VlogTestCase):
+    def stale(self, **job):
+        return {'heartbeat_at': timezone.now() - timedelta(hours=1), **job}
+
+    def test_stale_jobs_are_enqueued_again(self, delay):
+        vlog = self.create_vlog(**self.stale(attempts=1))
+        self.assertEqual(sweep_stuck_vlog_tasks(), (1, 0))
+        delay.assert_called_once_with(vlog.pk)
+        self.assertIsNone(VlogProcessingTask.objects.get(vlog=vlog).heartbeat_at)
+
+    def test_jobs_waiting_too_long_in_the_queue_are_enqueued_again(self, delay):
+        vlog = self.create_vlog(queued_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(sweep_stuck_vlog_tasks(), (1, 0))
+        delay.assert_called_once_with(vlog.pk)
+
+    def test_live_jobs_are_left_alone(self, delay):
+        self.create_vlog(attempts=1, heartbeat_at=timezone.now())
+        self.create_vlog()
+        self.assertEqual(sweep_stuck_vlog_tasks(), (0, 0))
+        delay.assert_not_called()
+
+    def test_exhausted_jobs_are_given_up(self, delay):
+        rejected = self.create_vlog(**self.stale(attempts=MAX_ATTEMPTS))
+        validated = self.create_vlog(**self.stale(attempts=MAX_ATTEMPTS, status=VlogProcessingTask.COMPLETED))
+        self.assertEqual(sweep_stuck_vlog_tasks(), (0, 1))
+        delay.assert_not_called()
+
+        rejected.refresh_from_db()
+        job = VlogProcessingTask.objects.get(vlog=rejected)
+        self.assertEqual((rejected.processing_status, job.status), ('failed', VlogProcessingTask.FAILED))
+        self.assertIsNotNone(job.finished_at)
+        # A validated vlog stays published without the derivatives
+        validated.refresh_from_db()
+        job = VlogProcessingTask.objects.get(vlog=validated)
+        self.assertNotEqual(validated.processing_status, 'failed')
+        self.assertEqual(job.status, VlogProcessingTask.COMPLETED)
+        self.assertIsNotNone(job.finished_at)
@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import VlogListView, VlogCreateView, VlogProcessingStatusView, VlogDetailView, VlogUpdateView, VlogDeleteView, CommentListView, CommentCreateView, CommentDetailView, CommentUpdateView, CommentDeleteView, ToggleLikeView, VlogLikersList
+from .views import VlogListView, VlogCreateView, VlogProcessingStatusView, VlogProcessingStatusStreamView, VlogPlaylistView, VlogDetailView, VlogUpdateView, VlogDeleteView, CommentListView, CommentCreateView, CommentDetailView, CommentUpdateView, CommentDeleteView, ToggleLikeView, VlogLikersList, TrendingVlogListView
 urlpatterns = [
     path('vlogs/', VlogListView.as_view(), name='video-list'),
     path('vlogs/create/', VlogCreateView.as_view(), name='Vlog-create'),
+    path('vlogs/trending/', TrendingVlogListView.as_view(), name='video-trending'),
     path('vlogs/<int:pk>/status/', VlogProcessingStatusView.as_view(), name='video-processing-status'),
+    path('vlogs/<int:pk>/status/stream/', VlogProcessingStatusStreamView.as_view(), name='video-processing-status-stream'),
+    path('vlogs/<int:pk>/hls/<str:name>', VlogPlaylistView.as_view(), name='video-hls-playlist'),
     path('vlogs/<int:pk>/', VlogDetailView.as_view(), name='Vlog-detail'),
     path('vlogs/<int:pk>/update/', VlogUpdateView.as_view(), name='Vlog-update'),
     path('vlogs/<int:pk>/delete/', VlogDeleteView.as_view(), name='Vlog-delete'),
@@ -1,38 +1,70 @@
 
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.views import View
 from rest_framework.response import Response
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from . import hls, status as processing_status
+from .media import HLS_CONTENT_TYPES
 from .tasks import process_video_validation
-from profiles.pagination import CustomPageNumberPagination
-from users.models import BlockedUser, CustomUser
+from deletions.services import delete_vlog
+from profiles.pagination import KeysetPagination, OldestFirstKeysetPagination
+from trend import like_buffer, trending
+from trend.response_cache import VersionedListCacheMixin
+from trend.views import TrendingListView
+from users.blocks import get_block_set
 from .models import Vlog, Comment, Like, VlogProcessingTask
 from .serializers import VlogSerializer, VlogCreateSerializer, CommentSerializer, VlogLikersSerializer
 
 
-class VlogListView(generics.ListAPIView):
+class VlogListView(VersionedListCacheMixin, generics.ListAPIView):
     queryset = Vlog.objects.all().order_by('-created_at')
     serializer_class = VlogSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
+    cache_namespace = 'vlogs'
 
-    # @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
-    # def get(self, request, *args, **kwargs):
-    #     return super().get(request, *args, **kwargs)
-    
     def get_queryset(self):
         """
-        Optionally restricts the returned videos to those not blocked by the author.
+        Shared by every viewer so the serialized page can be cached once, see `apply_viewer_overlay`.
         """
-        queryset = super().get_queryset()
-        user = self.request.user
-        if user.is_authenticated:
-            blocked_users = BlockedUser.objects.filter(blocker=user).values_list('blocked', flat=True)
-            blocked_by_users = BlockedUser.objects.filter(blocked=user).values_list('blocker', flat=True)
-            users_to_exclude = list(set(blocked_users).union(set(blocked_by_users)))
-            queryset = Vlog.objects.exclude(user__in=users_to_exclude).exclude(processing_status='failed')
-        return queryset.order_by('-created_at')
+        return super().get_queryset().select_related('user', 'user__profile').exclude(processing_status='failed')
+
+    def apply_viewer_overlay(self, request, body):
+        """
+        Restricts the returned videos to those not blocked by the author and flags the ones the viewer liked.
+        """
+        users_to_exclude = get_block_set(request.user)
+        results = [dict(vlog) for vlog in body['results'] if vlog['user_id'] not in users_to_exclude]
+        vlog_ids = [vlog['id'] for vlog in results]
+        liked_vlog_ids = set(Like.objects.filter(user=request.user, vlog_id__in=vlog_ids).values_list('vlog_id', flat=True))
+        if like_buffer.is_enabled():
+            like_buffer.apply_pending(like_buffer.VLOG, request.user, vlog_ids, liked_vlog_ids)
+            counts = like_buffer.buffered_counts(like_buffer.VLOG, vlog_ids)
+            for vlog in results:
+                vlog['like_count'] = counts.get(vlog['id'], vlog['like_count'])
+        for vlog in results:
+            vlog['liked'] = vlog['id'] in liked_vlog_ids
+        return {**body, 'results': results}
+
+
+class TrendingVlogListView(TrendingListView):
+    """
+    Vlogs ranked by recent likes, comments and views, see `trend.trending`.
+    """
+    queryset = Vlog.objects.select_related('user', 'user__profile').exclude(processing_status='failed')
+    trending_kind = trending.VLOG
+    serializer_class = VlogSerializer
 
 
 class VlogDetailView(generics.RetrieveAPIView):
@@ -40,6 +72,12 @@ class VlogDetailView(generics.RetrieveAPIView):
     serializer_class = VlogSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_object(self):
+        vlog = super().get_object()
+        like_buffer.apply_to_instances(like_buffer.VLOG, [vlog])
+        trending.record(trending.VLOG, vlog.pk, trending.VIEW)
+        return vlog
+
 
 class VlogUpdateView(generics.UpdateAPIView):
     queryset = Vlog.objects.all()
@@ -60,7 +98,14 @@ class VlogUpdateView(generics.UpdateAPIView):
         vlog.vlog_key = new_vlog_key
         vlog.processing_status = 'pending'
         vlog.save()
-
+        # Start a new processing job for the new upload
+        VlogProcessingTask.objects.update_or_create(vlog=vlog, defaults={
+            'status': VlogProcessingTask.PENDING, 'error_message': None, 'attempts': 0, 'queued_at': timezone.now(),
+            'started_at': None, 'heartbeat_at': None, 'finished_at': None, 'stage': None, 'stage_timings': {},
+            'failed_stages': [],
+        })
+        # Replaces the final status of the previous upload, which the status stream would replay
+        processing_status.publish(vlog.id, VlogProcessingTask.PENDING)
         process_video_validation.delay(vlog.id)
         return Response({'message': 'Video update initiated and is being processed',
                         'status_url': reverse('video-processing-status', args=[vlog.id])},
@@ -72,6 +117,10 @@ class VlogDeleteView(generics.DestroyAPIView):
     serializer_class = VlogSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        # Hidden right away, the comments, likes and media are removed by `deletions.tasks`
+        delete_vlog(instance)
+
 
 class VlogCreateView(generics.CreateAPIView):
     queryset = Vlog.objects.all()
@@ -81,9 +130,10 @@ class VlogCreateView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        video = serializer.save(user=self.request.user, processing_status='pending')
-        # Create the VideoProcessingTask to track the status
-        VlogProcessingTask.objects.create(vlog=video)
+        with transaction.atomic():
+            video = serializer.save(user=self.request.user, processing_status='pending')
+            # Create the VideoProcessingTask to track the status
+            VlogProcessingTask.objects.create(vlog=video)
         # Enqueue asynchronous tasks for processing
         process_video_validation.delay(video.id)
         # Return a response with the status endpoint
@@ -110,8 +160,60 @@ class VlogProcessingStatusView(APIView):
             return Response({'status': 'pending'})  # Default to 'pending' if task does not exist yet
 
 
+class VlogProcessingStatusStreamView(View):
+    """
+    Stream the processing status of a vlog as Server-Sent Events, one `status` event per
+    stage transition with the overall and stage progress, until processing is done or failed.
+
+    Async so that under ASGI a waiting client only holds an idle coroutine, not a worker.
+    Authenticated with the same JWT bearer token or session as the API views.
+    """
+
+    async def get(self, request, pk):
+        try:
+            authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=401)
+        user = authenticated[0] if authenticated else await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        if not await Vlog.objects.filter(id=pk).aexists():
+            return JsonResponse({'error': 'Vlog not found'}, status=404)
+
+        response = StreamingHttpResponse(processing_status.stream(pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Let nginx pass events through as they are written
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class VlogPlaylistView(View):
+    """
+    Serve an HLS playlist of a vlog with signed URIs, see `vlogs.hls`. Players cannot send
+    the API's credentials, the signed `token` query parameter authorizes the request.
+    """
+
+    def get(self, request, pk, name):
+        if not hls.PLAYLIST_NAME.match(name) or not hls.check_token(pk, request.GET.get('token', '')):
+            return JsonResponse({'error': 'Invalid or expired playlist token'}, status=403)
+        playlist_key = Vlog.objects.filter(id=pk).values_list('playlist_key', flat=True).first()
+        if not playlist_key:
+            return JsonResponse({'error': 'Playlist not found'}, status=404)
+        try:
+            body = hls.signed_playlist(pk, playlist_key, name)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return JsonResponse({'error': 'Playlist not found'}, status=404)
+            raise
+        response = HttpResponse(body, content_type=HLS_CONTENT_TYPES['.m3u8'])
+        # The segment URLs inside expire with the time bucket
+        response['Cache-Control'] = f'private, max-age={hls.URL_GRACE}'
+        return response
+
+
 class CommentListView(generics.ListAPIView):
     serializer_class = CommentSerializer
+    pagination_class = OldestFirstKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -135,7 +237,10 @@ class CommentCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         vlog_id = self.kwargs.get('vlog_id')
-        serializer.save(vlog_id=vlog_id, user=self.request.user)
+        with transaction.atomic():
+            serializer.save(vlog_id=vlog_id, user=self.request.user)
+            Vlog.objects.filter(pk=vlog_id).update(comments_count=F('comments_count') + 1)
+        trending.record(trending.VLOG, vlog_id, trending.COMMENT)
 
 
 class CommentUpdateView(generics.UpdateAPIView):
@@ -149,6 +254,11 @@ class CommentDeleteView(generics.DestroyAPIView):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Vlog.objects.filter(pk=instance.vlog_id).update(comments_count=Greatest(F('comments_count') - 1, 0))
+
 
 class ToggleLikeView(APIView):
     permission_classes = [IsAuthenticated]
@@ -161,13 +271,24 @@ class ToggleLikeView(APIView):
         except Vlog.DoesNotExist:
             return Response({'error': 'Post not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            like = Like.objects.get(vlog=vlog, user=request.user)
-            like.delete()
-            return Response({'status': 'Disliked'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            Like.objects.create(vlog=vlog, user=request.user)
-            return Response({'status': 'Liked'}, status=status.HTTP_200_OK)
+        if like_buffer.is_enabled():
+            liked = like_buffer.toggle(like_buffer.VLOG, vlog, request.user.pk,
+                                       lambda: Like.objects.filter(vlog=vlog, user=request.user).exists())
+            if liked:
+                trending.record(trending.VLOG, vlog.pk, trending.LIKE)
+            return Response({'status': 'Liked' if liked else 'Disliked'}, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            try:
+                like = Like.objects.get(vlog=vlog, user=request.user)
+                like.delete()
+                Vlog.objects.filter(pk=vlog.pk).update(likes_count=Greatest(F('likes_count') - 1, 0))
+                return Response({'status': 'Disliked'}, status=status.HTTP_200_OK)
+            except Like.DoesNotExist:
+                Like.objects.create(vlog=vlog, user=request.user)
+                Vlog.objects.filter(pk=vlog.pk).update(likes_count=F('likes_count') + 1)
+                trending.record(trending.VLOG, vlog.pk, trending.LIKE)
+                return Response({'status': 'Liked'}, status=status.HTTP_200_OK)
 
 
 class VlogLikersList(generics.ListAPIView):
@@ -175,17 +296,20 @@ class VlogLikersList(generics.ListAPIView):
         List all Vlog Likers.
     """
     serializer_class = VlogLikersSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        """The likes, paginated on `(Like.created_at, id)` so the most recent likers come first."""
         vlog_id = self.kwargs.get('pk')
         request_user = self.request.user
         if getattr(self, 'swagger_fake_view', False):
-            return Vlog.objects.none()
-        # Get list of blocked user IDs
-        blocked_users = BlockedUser.objects.filter(blocker=request_user).values_list('blocked', flat=True)
-        blocked_by_users = BlockedUser.objects.filter(blocked=request_user).values_list('blocker', flat=True)
-        users_to_exclude = list(set(blocked_users).union(set(blocked_by_users)))
-        likers_ids = Like.objects.filter(vlog_id=vlog_id).values_list('user_id', flat=True).order_by('-created_at')
-        return CustomUser.objects.filter(id__in=likers_ids).exclude(id__in=users_to_exclude)
+            return Like.objects.none()
+        users_to_exclude = get_block_set(request_user)
+        return Like.objects.filter(vlog_id=vlog_id, user__deleted_at__isnull=True).exclude(
+            user_id__in=users_to_exclude
+        ).select_related('user__profile')
+
+    def paginate_queryset(self, queryset):
+        likes = super().paginate_queryset(queryset)
+        return None if likes is None else [like.user for like in likes]